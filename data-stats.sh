@@ -11,6 +11,9 @@
 #   Train:   1000         934 (6.6% duplicates)
 #    Test:   1000         933 (6.7% duplicates)
 
+# For large or sharded datasets use the streaming equivalent instead:
+#   PYTHONPATH=python python -m babi.datastats train test [--workers N] [--on-disk]
+
 
 # Check that the user passed 2 files
 if [ $# -ne 2 ]
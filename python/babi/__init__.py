@@ -1,15 +1,24 @@
+from __future__ import annotations
+
+from typing import Any
+
 from .actions import Action, Create, Drop, Get, Give, SetDir, SetPos, SetProperty, Teleport, actions
 from .clause import Clause
 from .entity import Entity
-from .knowledge import EntityProperties, Knowledge, KnowledgeTable
+from .knowledge import EntityProperties, Knowledge, KnowledgeTable, RetentionError
+from .ordering import Ordering
 from .question import Question
 from .rule import Rule
+from .stringify import StoryWriter, render_lines, stringify, write_story
+from .support import ClauseRegistry, Support
 from .task import Task
 from .world import World
 
+
 __all__ = [
     "Action",
     "Clause",
+    "ClauseRegistry",
     "Create",
     "Drop",
     "Entity",
@@ -18,13 +27,31 @@ __all__ = [
     "Give",
     "Knowledge",
     "KnowledgeTable",
+    "Ordering",
     "Question",
+    "RetentionError",
     "Rule",
     "SetDir",
     "SetPos",
     "SetProperty",
+    "StoryWriter",
+    "Support",
     "Task",
     "Teleport",
     "World",
     "actions",
+    "render_lines",
+    "stream",
+    "stringify",
+    "write_story",
 ]
+
+
+def stream(task: Any, config: dict[str, Any] | None = None, seed: int = 0, **options: Any) -> Any:
+    """Prefetching iterator over generated stories; see ``babi.streaming.StoryStream``."""
+
+    # Imported here so that importing the package leaves the command line
+    # modules (``babi.generate``, ``babi.datastats``) alone.
+    from .streaming import StoryStream
+
+    return StoryStream(task, config, seed, **options)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Any
+from itertools import product
+from typing import Any, Sequence
 
 
 DIRECTIONS = {"n", "ne", "e", "se", "s", "sw", "w", "nw", "u", "d"}
@@ -31,6 +32,26 @@ class Action:
     def __str__(self) -> str:
         return self.__class__.__name__
 
+    def candidates(self, world: Any, actor: Any, *arg_pools: Sequence[Any]) -> list[tuple[Any, ...]]:
+        """All argument tuples drawn from ``arg_pools`` that are valid for ``actor``.
+
+        Duplicates in the pools are kept, so sampling uniformly from the
+        result matches rejection sampling over the pools. Subclasses build the
+        list directly from the world state where they can.
+        """
+
+        return [args for args in product(*arg_pools) if self.is_valid(world, actor, *args)]
+
+    def enumerates(self, arity: int) -> bool:
+        """Whether ``candidates`` lists the valid tuples for ``arity`` pools
+        without testing every combination.
+
+        ``Clause.sample_valid`` enumerates only such actions and samples the
+        others by rejection.
+        """
+
+        return False
+
 
 class Get(Action):
     def is_valid(self, world: Any, a0: Any, a1: Any, a2: Any = None, a3: Any = None) -> bool:
@@ -50,6 +71,25 @@ class Get(Action):
             return False
         return True
 
+    def enumerates(self, arity: int) -> bool:
+        return arity == 1
+
+    def candidates(self, world: Any, actor: Any, *arg_pools: Sequence[Any]) -> list[tuple[Any, ...]]:
+        if len(arg_pools) != 1:
+            return super().candidates(world, actor, *arg_pools)
+        if not (actor and getattr(actor, "is_actor", False)):
+            return []
+        location = getattr(actor, "is_in", None)
+        return [
+            (a1,)
+            for a1 in arg_pools[0]
+            if a1
+            and getattr(a1, "is_thing", False)
+            and getattr(a1, "is_gettable", False)
+            and actor.can_hold(a1)
+            and getattr(a1, "is_in", None) == location
+        ]
+
     def perform(self, world: Any, a0: Any, a1: Any, a2: Any = None, a3: Any = None) -> None:
         a1.is_in = a0
         a0.carry += a1.size
@@ -67,6 +107,21 @@ class Drop(Action):
             return False
         return a1.is_in == a0
 
+    def enumerates(self, arity: int) -> bool:
+        return arity == 1
+
+    def candidates(self, world: Any, actor: Any, *arg_pools: Sequence[Any]) -> list[tuple[Any, ...]]:
+        if len(arg_pools) != 1:
+            return super().candidates(world, actor, *arg_pools)
+        if not getattr(actor, "is_actor", False):
+            return []
+        # Only things the actor is holding can be dropped.
+        return [
+            (a1,)
+            for a1 in arg_pools[0]
+            if a1 and getattr(a1, "is_thing", False) and getattr(a1, "is_in", None) == actor
+        ]
+
     def perform(self, world: Any, a0: Any, a1: Any) -> None:
         a1.is_in = a0.is_in
         a0.carry -= a1.size
@@ -155,6 +210,17 @@ class Teleport(Action):
             return False
         return True
 
+    def enumerates(self, arity: int) -> bool:
+        return arity == 1
+
+    def candidates(self, world: Any, actor: Any, *arg_pools: Sequence[Any]) -> list[tuple[Any, ...]]:
+        if len(arg_pools) != 1:
+            return super().candidates(world, actor, *arg_pools)
+        if not (actor and getattr(actor, "is_actor", False) and getattr(actor, "is_god", False)):
+            return []
+        location = getattr(actor, "is_in", None)
+        return [(a1,) for a1 in arg_pools[0] if a1 and getattr(a1, "is_thing", False) and location != a1]
+
     def perform(self, world: Any, a0: Any, a1: Any) -> None:
         if getattr(a0, "is_in", None):
             a0.is_in.carry -= a0.size
@@ -172,6 +238,19 @@ class Give(Action):
             return False
         return obj.is_in == actor
 
+    def enumerates(self, arity: int) -> bool:
+        return arity == 2
+
+    def candidates(self, world: Any, actor: Any, *arg_pools: Sequence[Any]) -> list[tuple[Any, ...]]:
+        if len(arg_pools) != 2:
+            return super().candidates(world, actor, *arg_pools)
+        location = getattr(actor, "is_in", None)
+        objs = [obj for obj in arg_pools[0] if getattr(obj, "is_in", None) == actor]
+        if not objs:
+            return []
+        recipients = [r for r in arg_pools[1] if r != actor and getattr(r, "is_in", None) == location]
+        return [(obj, recipient) for obj in objs for recipient in recipients]
+
     def perform(self, world: Any, actor: Any, obj: Any, recipient: Any) -> None:
         obj.is_in = recipient
 
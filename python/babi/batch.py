@@ -0,0 +1,181 @@
+"""Lockstep simulation of many copies of a world with NumPy.
+
+``BatchWorld`` holds B copies of one world as arrays (the location and
+carried size of every entity per copy) and steps all of them at once for the
+movement and possession actions ``Teleport``, ``Get``, ``Drop`` and ``Give``::
+
+    batch = BatchWorld(world, 1024, seed=0)
+    for _ in range(steps):
+        batch.step(world.get_actors(), [actions["teleport"], actions["get"]], pool)
+    for story, knowledge in batch.stories():
+        print(stringify(story, knowledge))
+
+Each step of each copy draws uniformly from its valid clauses, as
+``Clause.sample_valid`` does, but from a NumPy generator, so the stories
+differ from those of the per-clause engine for the same seed. Entity flags
+and sizes are read once from the world; only ``is_in`` and ``carry`` change.
+Requires NumPy.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterator, Sequence
+
+from .actions import Drop, Get, Give, Teleport
+from .clause import Clause
+from .knowledge import Knowledge
+from .world import World, WorldTemplate
+
+
+# Action codes in the recorded history.
+TELEPORT, GET, DROP, GIVE = range(4)
+_CODES = ((Teleport, TELEPORT), (Get, GET), (Drop, DROP), (Give, GIVE))
+
+
+def _code(action: Any) -> int:
+    for cls, code in _CODES:
+        if isinstance(action, cls):
+            return code
+    raise ValueError(f"batched simulation does not support {action}")
+
+
+class BatchWorld:
+    def __init__(self, world: World, batch_size: int, seed: int | None = None):
+        import numpy as np
+
+        self.world = world
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self._template = WorldTemplate.from_world(world)
+        self.ids = list(world.entities)
+        entities = list(world.entities.values())
+        self.index = {entity: i for i, entity in enumerate(entities)}
+
+        def flags(*names: str) -> Any:
+            return np.array([all(getattr(e, name, False) for name in names) for e in entities], dtype=bool)
+
+        self.is_actor = flags("is_actor")
+        self.is_god_actor = flags("is_actor", "is_god")
+        self.is_thing = flags("is_thing")
+        self.is_gettable = flags("is_thing", "is_gettable")
+        self.size = np.array([e.size for e in entities], dtype=np.int64)
+
+        location = []
+        for e in entities:
+            place = getattr(e, "is_in", None)
+            if place is not None and place not in self.index:
+                raise ValueError(f"{e} is not in an entity of the world")
+            location.append(-1 if place is None else self.index[place])
+        # -1 stands for no location.
+        self.location = np.tile(np.array(location, dtype=np.int64), (batch_size, 1))
+        self.carry = np.tile(np.array([e.carry for e in entities], dtype=np.int64), (batch_size, 1))
+        self.history: list[Any] = []
+
+    def _indices(self, entities: Sequence[Any]) -> Any:
+        import numpy as np
+
+        return np.array([self.index[e] for e in entities], dtype=np.int64)
+
+    def _mask(self, code: int, a: Any, p: Any, r: Any) -> Any:
+        """Valid argument choices of every copy, shaped ``(B, actors, pool[, recipients])``."""
+
+        loc = self.location
+        actor_loc = loc[:, a][:, :, None]
+        if code == TELEPORT:
+            static = self.is_god_actor[a][:, None] & self.is_thing[p][None, :]
+            return static & (actor_loc != p[None, None, :])
+        if code == GET:
+            static = self.is_actor[a][:, None] & self.is_gettable[p][None, :]
+            fits = self.size[a][None, :, None] >= self.carry[:, a][:, :, None] + self.size[p][None, None, :]
+            return static & fits & (loc[:, p][:, None, :] == actor_loc)
+        if code == DROP:
+            static = self.is_actor[a][:, None] & self.is_thing[p][None, :]
+            return static & (loc[:, p][:, None, :] == a[None, :, None])
+        held = loc[:, p][:, None, :, None] == a[None, :, None, None]
+        present = loc[:, r][:, None, None, :] == actor_loc[..., None]
+        return held & present & (r[None, :] != a[:, None])[None, :, None, :]
+
+    def step(self, actors: Sequence[Any], actions: Sequence[Any], *arg_pools: Sequence[Any]) -> Any:
+        """Sample and perform one valid clause in every copy.
+
+        Takes the same pools as ``Clause.sample_valid``: one for teleport,
+        get and drop, two (objects, recipients) for give. Returns a boolean
+        array of the copies that had a valid clause; the others are unchanged.
+        """
+
+        import numpy as np
+
+        codes = [_code(action) for action in actions]
+        for action, code in zip(actions, codes):
+            pools = 2 if code == GIVE else 1
+            if len(arg_pools) != pools:
+                raise ValueError(f"{action} takes {pools} argument pools")
+        a, *pools = (self._indices(entities) for entities in (actors, *arg_pools))
+        p = pools[0] if pools else a[:0]
+        r = pools[1] if len(pools) > 1 else a[:0]
+        B = self.batch_size
+
+        masks = [self._mask(code, a, p, r) for code in codes]
+        flat = np.concatenate([mask.reshape(B, -1) for mask in masks], axis=1) if masks else np.zeros((B, 1), dtype=bool)
+        counts = flat.sum(axis=1)
+        stepped = counts > 0
+        # The k-th valid option of each copy, with k uniform below its count.
+        k = np.floor(self.rng.random(B) * counts).astype(np.int64)
+        choice = (np.cumsum(flat, axis=1) > k[:, None]).argmax(axis=1)
+
+        record = np.full((B, 4), -1, dtype=np.int64)
+        offset = 0
+        for code, mask in zip(codes, masks):
+            width = int(np.prod(mask.shape[1:]))
+            rows = np.nonzero(stepped & (choice >= offset) & (choice < offset + width))[0]
+            picks = np.unravel_index(choice[rows] - offset, mask.shape[1:])
+            offset += width
+            actor, obj = a[picks[0]], p[picks[1]]
+            record[rows, 0] = code
+            record[rows, 1] = actor
+            record[rows, 2] = obj
+            if code == TELEPORT:
+                old = self.location[rows, actor]
+                placed = old >= 0
+                self.carry[rows[placed], old[placed]] -= self.size[actor[placed]]
+                self.location[rows, actor] = obj
+                self.carry[rows, obj] += self.size[actor]
+            elif code == GET:
+                self.location[rows, obj] = actor
+                self.carry[rows, actor] += self.size[obj]
+            elif code == DROP:
+                self.location[rows, obj] = self.location[rows, actor]
+                self.carry[rows, actor] -= self.size[obj]
+            else:
+                recipient = r[picks[2]]
+                record[rows, 3] = recipient
+                self.location[rows, obj] = recipient
+        self.history.append(record)
+        return stepped
+
+    def clauses(self, i: int, world: World | None = None) -> list[Clause]:
+        """The story of copy ``i`` as clauses over ``world`` (a fresh copy by default)."""
+
+        world = world if world is not None else self._template.instantiate()
+        names = ("teleport", "get", "drop", "give")
+        entities = [world.entities[id_] for id_ in self.ids]
+        story = []
+        for record in self.history:
+            code, actor, *args = record[i].tolist()
+            if code < 0:
+                continue
+            args = [entities[arg] for arg in args if arg >= 0]
+            story.append(Clause(world, True, entities[actor], world.actions[names[code]], *args))
+        return story
+
+    def stories(self, rules: Any = None) -> Iterator[tuple[list[Clause], Knowledge]]:
+        """Replay every copy as ``(story, knowledge)``, ready for ``stringify``."""
+
+        for i in range(self.batch_size):
+            world = self._template.instantiate()
+            knowledge = Knowledge(world, rules)
+            story = self.clauses(i, world)
+            for clause in story:
+                clause.perform()
+                knowledge.update(clause)
+            yield story, knowledge
@@ -0,0 +1,393 @@
+"""Throughput benchmarks for the Python engine.
+
+Usage::
+
+    python -m babi.benchmark [--output FILE] [--quick] [--seed N] [--repeat N]
+        [--task SPEC ...] [--compare BASELINE]
+
+Every benchmark runs on synthetic worlds of growing size built from fixed
+seeds, keeps the best of ``--repeat`` timings and reports rates per second.
+Results are written as JSON (to stdout without ``--output``); with
+``--compare`` each rate is also printed as a ratio to an earlier result file.
+``--task`` adds end-to-end stories/sec for a task spec as accepted by
+``babi.generate``; the built-in ``WalkTask`` is always measured.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from .actions import actions
+from .clause import Clause
+from .generate import generate_story, load_task, story_seed, task_config
+from .knowledge import Knowledge
+from .stringify import render_lines, stringify
+from .task import Task
+from .utilities import Grid
+from .world import World, WorldTemplate, clear_caches
+
+
+FORMAT_VERSION = 1
+SIZES = (8, 32, 128)
+GRID_SIZES = (8, 16, 32)
+STEPS = 200
+REPEAT = 3
+BATCH_SIZES = (64, 1024)
+
+
+def write_world_file(path: str | Path, size: int) -> Path:
+    """World file with ``size`` actors, locations and objects each."""
+
+    lines = []
+    for i in range(size):
+        lines += [f"create loc{i}", f"set loc{i} is_thing", f"set loc{i} is_location"]
+    for i in range(size):
+        lines += [f"create actor{i}", f"set actor{i} is_thing", f"set actor{i} is_actor", f"set actor{i} is_god"]
+        lines.append(f"set actor{i} is_in loc{i}")
+    for i in range(size):
+        lines += [f"create obj{i}", f"set obj{i} is_thing", f"set obj{i} is_gettable"]
+        lines.append(f"set obj{i} is_in loc{(i * 7) % size}")
+    Path(path).write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return Path(path)
+
+
+@lru_cache(maxsize=None)
+def _synthetic_template(size: int) -> WorldTemplate:
+    with tempfile.TemporaryDirectory() as tmp:
+        world = World()
+        world.load(write_world_file(Path(tmp) / "world.txt", size))
+    return WorldTemplate.from_world(world)
+
+
+def synthetic_world(size: int) -> World:
+    """Fresh copy of the synthetic world of ``size``, built from a file once per size."""
+
+    return _synthetic_template(size).instantiate()
+
+
+def _walk_step(world: World) -> Clause | None:
+    pool = (*world.get_locations(), *world.get_objects())
+    moves = (actions["teleport"], actions["get"], actions["drop"])
+    clause = Clause.sample_valid(world, [True], world.get_actors(), moves, pool)
+    if clause is not None:
+        clause.perform()
+    return clause
+
+
+class WalkTask(Task):
+    """Actors teleporting, picking up and dropping objects in a synthetic world."""
+
+    DEFAULT_CONFIG = {"size": 8, "steps": 20}
+
+    def new_world(self, config: dict[str, Any]) -> World:
+        return synthetic_world(config["size"])
+
+    def generate_story(self, world: World, knowledge: Knowledge, story: list[Any], config: dict[str, Any]):
+        for _ in range(config["steps"]):
+            clause = _walk_step(world)
+            if clause is None:
+                break
+            knowledge.update(clause)
+            story.append(clause)
+        return story, knowledge
+
+
+@lru_cache(maxsize=8)
+def _walk(size: int, steps: int, seed: int) -> tuple[World, list[Clause]]:
+    # Shared by the benchmarks below, which only read the final world.
+    random.seed(seed)
+    world = synthetic_world(size)
+    story = []
+    for _ in range(steps):
+        clause = _walk_step(world)
+        if clause is not None:
+            story.append(clause)
+    return world, story
+
+
+def _best(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return max(best, 1e-9)
+
+
+def _result(name: str, params: dict[str, Any], **metrics: float) -> dict[str, Any]:
+    return {"name": name, "params": params, "metrics": metrics}
+
+
+def bench_knowledge(sizes: Iterable[int], steps: int, repeat: int, seed: int) -> list[dict[str, Any]]:
+    """``Knowledge.update`` steps/sec and ``EntityProperties`` queries/sec."""
+
+    results = []
+    for size in sizes:
+        world, story = _walk(size, steps, seed)
+
+        def update() -> Knowledge:
+            knowledge = Knowledge(world)
+            for clause in story:
+                knowledge.update(clause)
+            return knowledge
+
+        seconds = _best(update, repeat)
+        results.append(_result("knowledge.update", {"size": size, "steps": len(story)}, steps_per_sec=len(story) / seconds))
+
+        table = update().current()
+        entities = list(world.entities.values())
+        locations = world.get_locations()
+
+        def query() -> None:
+            for entity in entities:
+                props = table[entity]
+                props.get_value("is_in")
+                props.get_values("is_in")
+                props.get_exclusive_value("is_in")
+                props.is_true("is_in", locations[0])
+
+        seconds = _best(query, repeat)
+        results.append(_result("entity_properties.query", {"size": size}, queries_per_sec=4 * len(entities) / seconds))
+    return results
+
+
+def bench_sample_valid(sizes: Iterable[int], steps: int, repeat: int, seed: int) -> list[dict[str, Any]]:
+    """``Clause.sample_valid`` calls/sec and the share of valid clauses in the pools."""
+
+    results = []
+    moves = (actions["teleport"], actions["get"], actions["drop"])
+    for size in sizes:
+        world, _ = _walk(size, steps, seed)
+        actors = world.get_actors()
+        pool = (*world.get_locations(), *world.get_objects())
+        calls = max(steps // 4, 1)
+
+        def sample() -> None:
+            for _ in range(calls):
+                Clause.sample_valid(world, [True], actors, moves, pool)
+
+        random.seed(seed)
+        seconds = _best(sample, repeat)
+        valid = sum(len(move.candidates(world, actor, pool)) for actor in actors for move in moves)
+        results.append(
+            _result(
+                "clause.sample_valid",
+                {"size": size},
+                calls_per_sec=calls / seconds,
+                acceptance_rate=valid / (len(actors) * len(moves) * len(pool)),
+            )
+        )
+    return results
+
+
+def bench_world_load(sizes: Iterable[int], repeat: int) -> list[dict[str, Any]]:
+    """Uncached ``World.load`` (caches cleared) and cached ``World.from_file``."""
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = write_world_file(Path(tmp) / f"world{size}.txt", size)
+            entities = len(synthetic_world(size).entities)
+
+            def load() -> None:
+                # Parse the file every time, as a process loading it first would.
+                clear_caches()
+                World().load(path)
+
+            seconds = _best(load, repeat)
+            World.from_file(path)  # warm the template cache
+            cached = _best(lambda: World.from_file(path), repeat)
+            results.append(
+                _result(
+                    "world.load",
+                    {"size": size, "entities": entities},
+                    loads_per_sec=1 / seconds,
+                    template_loads_per_sec=1 / cached,
+                )
+            )
+    return results
+
+
+def bench_grid(sizes: Iterable[int], repeat: int, seed: int, k: int = 4) -> list[dict[str, Any]]:
+    """Uncached ``Grid.dijkstra`` and ``Grid.yen`` on full square grids."""
+
+    results = []
+    for size in sizes:
+        grid = Grid(size)
+        for i in range(1, size * size + 1):
+            grid.add_node(i)
+        rng = random.Random(seed)
+        pairs = [tuple(rng.sample(range(1, size * size + 1), 2)) for _ in range(8)]
+
+        def dijkstra() -> None:
+            for source, target in pairs:
+                grid.dijkstra(source, target)
+
+        def yen() -> None:
+            grid._paths.clear()
+            for source, target in pairs:
+                grid.yen(source, target, k)
+
+        results.append(
+            _result(
+                "grid.paths",
+                {"size": size, "k": k},
+                dijkstra_per_sec=len(pairs) / _best(dijkstra, repeat),
+                yen_per_sec=len(pairs) / _best(yen, repeat),
+            )
+        )
+    return results
+
+
+def bench_stringify(sizes: Iterable[int], steps: int, repeat: int, seed: int) -> list[dict[str, Any]]:
+    results = []
+    for size in sizes:
+        world, story = _walk(size, steps, seed)
+        knowledge = Knowledge(world)
+        for clause in story:
+            knowledge.update(clause)
+        seconds = _best(lambda: stringify(story, knowledge), repeat)
+        lines = sum(1 for _ in render_lines(story, knowledge))
+        results.append(_result("stringify", {"size": size, "lines": lines}, lines_per_sec=lines / seconds))
+    return results
+
+
+def bench_tasks(tasks: Iterable[str | Task | type[Task]], stories: int, repeat: int, seed: int) -> list[dict[str, Any]]:
+    """End-to-end stories/sec per task, seeded as in ``babi.generate``."""
+
+    results = []
+    for spec in tasks:
+        task = load_task(spec)
+        config = task_config(task)
+
+        def generate() -> None:
+            for index in range(stories):
+                generate_story(task, config, story_seed(seed, index))
+
+        seconds = _best(generate, repeat)
+        results.append(_result("task.generate", {"task": type(task).__name__}, stories_per_sec=stories / seconds))
+    return results
+
+
+def bench_batch(sizes: Iterable[int], batch_sizes: Iterable[int], repeat: int, seed: int) -> list[dict[str, Any]]:
+    """``WalkTask`` stories/sec simulated by ``BatchWorld``, without rendering."""
+
+    from .batch import BatchWorld
+
+    results = []
+    steps = WalkTask.DEFAULT_CONFIG["steps"]
+    moves = (actions["teleport"], actions["get"], actions["drop"])
+    for size in sizes:
+        world = synthetic_world(size)
+        pool = (*world.get_locations(), *world.get_objects())
+        for batch_size in batch_sizes:
+
+            def simulate() -> None:
+                batch = BatchWorld(world, batch_size, seed)
+                for _ in range(steps):
+                    batch.step(world.get_actors(), moves, pool)
+
+            seconds = _best(simulate, repeat)
+            results.append(
+                _result("batch.walk", {"size": size, "batch": batch_size}, stories_per_sec=batch_size / seconds)
+            )
+    return results
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    sizes: Iterable[int] = SIZES,
+    grid_sizes: Iterable[int] = GRID_SIZES,
+    steps: int = STEPS,
+    repeat: int = REPEAT,
+    tasks: Iterable[str | Task | type[Task]] = (),
+    seed: int = 0,
+) -> dict[str, Any]:
+    """Run every benchmark and return the JSON-serializable report."""
+
+    sizes, grid_sizes = list(sizes), list(grid_sizes)
+    results = [
+        *bench_knowledge(sizes, steps, repeat, seed),
+        *bench_sample_valid(sizes, steps, repeat, seed),
+        *bench_world_load(sizes, repeat),
+        *bench_grid(grid_sizes, repeat, seed),
+        *bench_stringify(sizes, steps, repeat, seed),
+        *bench_tasks([WalkTask, *tasks], max(steps // 10, 1), repeat, seed),
+        *bench_batch(sizes, BATCH_SIZES, repeat, seed),
+    ]
+    return {
+        "version": FORMAT_VERSION,
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def _key(result: dict[str, Any]) -> tuple[str, str]:
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def compare(baseline: dict[str, Any], report: dict[str, Any]) -> list[tuple[str, dict[str, Any], str, float, float]]:
+    """``(name, params, metric, baseline, current)`` for every rate found in both reports."""
+
+    old = {_key(result): result for result in baseline["results"]}
+    rows = []
+    for result in report["results"]:
+        previous = old.get(_key(result))
+        if previous is None:
+            continue
+        for metric, value in result["metrics"].items():
+            if metric in previous["metrics"]:
+                rows.append((result["name"], result["params"], metric, previous["metrics"][metric], value))
+    return rows
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m babi.benchmark", description="Benchmark the bAbI engine.")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--quick", action="store_true", help="small sizes only, for smoke runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="keep the best of this many timings")
+    parser.add_argument("--task", action="append", default=[], help="also measure this task end to end")
+    parser.add_argument("--compare", default=None, help="print ratios to an earlier JSON report")
+    args = parser.parse_args(argv)
+
+    options = dict(repeat=args.repeat, tasks=args.task, seed=args.seed)
+    if args.quick:
+        options.update(sizes=SIZES[:1], grid_sizes=GRID_SIZES[:1], steps=STEPS // 4)
+    report = run(**options)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        for name, params, metric, old, new in compare(baseline, report):
+            print(f"{name} {json.dumps(params, sort_keys=True)} {metric}: {new / old:.2f}x", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
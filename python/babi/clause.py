@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+import math
 import random
 from dataclasses import dataclass, field
-from typing import Any, Iterable, Sequence
+from typing import Any, Sequence
+
+from . import profiling
+
+
+# Rejected draws before ``sample_valid`` enumerates every action.
+MAX_DRAWS = 100
 
 
 @dataclass(eq=False)
@@ -49,12 +56,52 @@ class Clause:
         actions: Sequence[Any],
         *arg_pools: Sequence[Any],
     ) -> "Clause | None":
-        for _ in range(100):
-            truth_value = random.choice(truth_values)
-            actor = random.choice(actors)
-            action = random.choice(actions)
-            args = [random.choice(pool) for pool in arg_pools]
-            clause = cls(world, truth_value, actor, action, *args)
-            if clause.is_valid():
-                return clause
-        return None
+        """Sample a valid clause uniformly from the given pools.
+
+        Actions that can list their valid arguments directly (see
+        ``Action.enumerates``) are enumerated; clauses of the other actions
+        are drawn from the pools and checked one at a time, together with
+        the enumerated ones so that every valid clause is equally likely.
+        After ``MAX_DRAWS`` rejected draws the other actions are enumerated
+        too, so None is only returned when no valid clause exists.
+        """
+
+        arity = len(arg_pools)
+        options = []
+        unchecked = []
+        for actor in actors:
+            for action in actions:
+                if action.enumerates(arity):
+                    options.extend((actor, action, args) for args in action.candidates(world, actor, *arg_pools))
+                else:
+                    unchecked.append((actor, action))
+        size = len(unchecked) * math.prod(map(len, arg_pools))
+        truth_value = random.choice(truth_values)
+        pick, draws = None, 0
+        if size:
+            for draws in range(1, MAX_DRAWS + 1):
+                if random.randrange(len(options) + size) < len(options):
+                    pick = random.choice(options)
+                    break
+                actor, action = random.choice(unchecked)
+                args = tuple(random.choice(pool) for pool in arg_pools)
+                if action.is_valid(world, actor, *args):
+                    pick = actor, action, args
+                    break
+            else:
+                options.extend(
+                    (actor, action, args) for actor, action in unchecked for args in action.candidates(world, actor, *arg_pools)
+                )
+        if pick is None and options:
+            pick = random.choice(options)
+
+        profile = profiling.active
+        if profile is not None:
+            profile.count("sample_valid.calls")
+            profile.count("sample_valid.candidates", len(options))
+            profile.count("sample_valid.draws", draws)
+            profile.count("sample_valid.successes", pick is not None)
+        if pick is None:
+            return None
+        actor, action, args = pick
+        return cls(world, truth_value, actor, action, *args)
@@ -0,0 +1,249 @@
+"""Duplicate and train/test overlap statistics for generated datasets.
+
+Usage::
+
+    python -m babi.datastats TRAIN TEST [--workers N] [--on-disk] [--tmp-dir DIR]
+
+Streaming replacement for ``data-stats.sh`` that prints the same report.
+``TRAIN`` and ``TEST`` are files, directories of shards or glob patterns. As
+in the script, each *story* is one example, normalized by keeping the first
+two tab-separated fields of every line; stories are compared by the 64-bit
+digest of ``babi.digest``. With ``--on-disk`` digests are spilled to sorted runs and
+merged, so memory stays bounded for very large datasets.
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import heapq
+import math
+import os
+import tempfile
+from array import array
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from .digest import normalize_line, story_digest
+
+
+RUN_SIZE = 1 << 22
+READ_SIZE = 1 << 16
+
+
+def iter_story_digests(path: str | Path) -> Iterator[int]:
+    """Digest of every story of a text dataset, streaming."""
+
+    h = None
+    with open(path, encoding="utf-8", buffering=1 << 20) as handle:
+        for line in handle:
+            if line.startswith("1 ") and h is not None:
+                yield int.from_bytes(h.digest(), "little")
+                h = None
+            if not line.strip():
+                continue
+            if h is None:
+                h = hashlib.blake2b(digest_size=8)
+            h.update(normalize_line(line).encode("utf-8"))
+    if h is not None:
+        yield int.from_bytes(h.digest(), "little")
+
+
+class BloomFilter:
+    """Compact probabilistic set of story digests.
+
+    Never reports a digest it has not seen as missing; reports an unseen
+    digest as present with probability about ``error_rate``. Bits live in one
+    ``bytearray``, so forked worker processes share it copy-on-write.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 1e-6):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: int) -> Iterator[int]:
+        h1, h2 = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, digest: int) -> None:
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def update(self, digests: Iterable[int]) -> None:
+        for digest in digests:
+            self.add(digest)
+
+    def __contains__(self, digest: object) -> bool:
+        return isinstance(digest, int) and all(
+            self.bits[position >> 3] >> (position & 7) & 1 for position in self._positions(digest)
+        )
+
+
+def load_seen(paths: Iterable[str], error_rate: float | None = None) -> set[int] | BloomFilter:
+    """Digests of every story in ``paths``, as a set or a Bloom filter."""
+
+    paths = [path for spec in paths for path in expand(spec)]
+    if error_rate is None:
+        return {digest for path in paths for digest in iter_story_digests(path)}
+    capacity = sum(1 for path in paths for _ in iter_story_digests(path))
+    seen = BloomFilter(capacity, error_rate)
+    for path in paths:
+        seen.update(iter_story_digests(path))
+    return seen
+
+
+def expand(spec: str) -> list[str]:
+    if os.path.isdir(spec):
+        return sorted(str(p) for p in Path(spec).iterdir() if p.is_file() and p.suffix != ".idx")
+    matches = sorted(glob.glob(spec))
+    return matches or [spec]
+
+
+def _digest_file(path: str) -> tuple[int, array]:
+    digests = array("Q", iter_story_digests(path))
+    return len(digests), digests
+
+
+def _write_run(digests: array, tmp_dir: str) -> str:
+    digests = array("Q", sorted(digests))
+    fd, path = tempfile.mkstemp(suffix=".run", dir=tmp_dir)
+    with os.fdopen(fd, "wb") as handle:
+        digests.tofile(handle)
+    return path
+
+
+def _spill_file(job: tuple[str, str]) -> tuple[int, list[str]]:
+    path, tmp_dir = job
+    count, runs, chunk = 0, [], array("Q")
+    for digest in iter_story_digests(path):
+        chunk.append(digest)
+        count += 1
+        if len(chunk) >= RUN_SIZE:
+            runs.append(_write_run(chunk, tmp_dir))
+            chunk = array("Q")
+    if chunk:
+        runs.append(_write_run(chunk, tmp_dir))
+    return count, runs
+
+
+def _read_run(path: str) -> Iterator[int]:
+    with open(path, "rb") as handle:
+        while True:
+            block = handle.read(READ_SIZE * 8)
+            if not block:
+                return
+            yield from array("Q", block)
+
+
+def _unique(sorted_digests: Iterable[int]) -> Iterator[int]:
+    previous = None
+    for digest in sorted_digests:
+        if digest != previous:
+            yield digest
+            previous = digest
+
+
+def _intersection_size(a: Iterator[int], b: Iterator[int]) -> int:
+    count = 0
+    x, y = next(a, None), next(b, None)
+    while x is not None and y is not None:
+        if x == y:
+            count += 1
+            x, y = next(a, None), next(b, None)
+        elif x < y:
+            x = next(a, None)
+        else:
+            y = next(b, None)
+    return count
+
+
+class SplitStats(NamedTuple):
+    examples: int
+    unique: int
+
+    @property
+    def duplicate_pct(self) -> float:
+        return 100.0 * (self.examples - self.unique) / self.examples if self.examples else 0.0
+
+
+class OverlapStats(NamedTuple):
+    train: SplitStats
+    test: SplitStats
+    overlap: int
+
+    @property
+    def overlap_pct(self) -> float:
+        return 100.0 * self.overlap / self.test.unique if self.test.unique else 0.0
+
+    def report(self) -> str:
+        lines = [
+            f"Overlap: {self.overlap} overlapping unique examples ({self.overlap_pct:.1f}% of test set)",
+            "",
+            "           # Examples   # Unique examples",
+        ]
+        for name, split in (("Train", self.train), ("Test", self.test)):
+            lines.append(
+                f"  {name:>5}:   {split.examples:<12} {split.unique} ({split.duplicate_pct:.1f}% duplicates)"
+            )
+        return "\n".join(lines)
+
+
+def _map(fn, jobs: list, workers: int) -> list:
+    if workers <= 1 or len(jobs) <= 1:
+        return [fn(job) for job in jobs]
+    with Pool(min(workers, len(jobs))) as pool:
+        return pool.map(fn, jobs)
+
+
+def overlap_stats(
+    train: Iterable[str], test: Iterable[str], workers: int = 1, on_disk: bool = False, tmp_dir: str | None = None
+) -> OverlapStats:
+    """Duplicate and overlap statistics of two splits, each a list of shard files."""
+
+    train, test = list(train), list(test)
+    if not on_disk:
+        results = _map(_digest_file, train + test, workers)
+        sets = []
+        counts = []
+        for part in (results[: len(train)], results[len(train) :]):
+            seen: set[int] = set()
+            for _, digests in part:
+                seen.update(digests)
+            sets.append(seen)
+            counts.append(sum(count for count, _ in part))
+        splits = [SplitStats(count, len(seen)) for count, seen in zip(counts, sets)]
+        return OverlapStats(splits[0], splits[1], len(sets[0] & sets[1]))
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as scratch:
+        results = _map(_spill_file, [(path, scratch) for path in train + test], workers)
+        splits, merged = [], []
+        for part in (results[: len(train)], results[len(train) :]):
+            runs = [run for _, paths in part for run in paths]
+            unique = sum(1 for _ in _unique(heapq.merge(*map(_read_run, runs))))
+            splits.append(SplitStats(sum(count for count, _ in part), unique))
+            merged.append(runs)
+        overlap = _intersection_size(
+            _unique(heapq.merge(*map(_read_run, merged[0]))), _unique(heapq.merge(*map(_read_run, merged[1])))
+        )
+        return OverlapStats(splits[0], splits[1], overlap)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m babi.datastats", description=__doc__.split("\n\n")[0])
+    parser.add_argument("train", help="training file, shard directory or glob")
+    parser.add_argument("test", help="test file, shard directory or glob")
+    parser.add_argument("--workers", type=int, default=1, help="hash shards in parallel")
+    parser.add_argument("--on-disk", action="store_true", help="merge sorted digest runs instead of in-memory sets")
+    parser.add_argument("--tmp-dir", default=None, help="where to spill digest runs")
+    args = parser.parse_args(argv)
+    stats = overlap_stats(expand(args.train), expand(args.test), args.workers, args.on_disk, args.tmp_dir)
+    print(stats.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Story digests shared by generation and the dataset statistics.
+
+A story is normalized by keeping the first two tab-separated fields of every
+line, as ``cut -f 1,2`` does in ``data-stats.sh``, and hashed to a 64-bit
+blake2b digest.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Iterable
+
+
+def normalize_line(line: str) -> str:
+    """``cut -f 1,2`` of one story line, without its newline."""
+
+    return "\t".join(line.rstrip("\n").split("\t")[:2])
+
+
+def story_digest(story: str | Iterable[str]) -> int:
+    """64-bit digest of a story given as text or as lines."""
+
+    lines = story.split("\n") if isinstance(story, str) else story
+    h = hashlib.blake2b(digest_size=8)
+    for line in lines:
+        h.update(normalize_line(line).encode("utf-8"))
+    return int.from_bytes(h.digest(), "little")
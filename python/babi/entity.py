@@ -1,24 +1,98 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from typing import Any, Dict
+from typing import Any, Dict, Iterator
+
+
+FLAGS = ("is_actor", "is_god", "is_location", "is_gettable", "is_container", "is_male", "is_female", "is_animal")
+DIRECTIONS = ("n", "ne", "e", "se", "s", "sw", "w", "nw", "u", "d")
+# Core state lives in slots. Role flags default to False, because checks
+# like ``getattr(entity, "is_actor", False)`` are much slower on an unset
+# slot than on a set one. ``is_in``, coordinates and direction links stay
+# unset until assigned, so reading them on an entity that was never placed
+# raises AttributeError as before. Any other property goes to the instance
+# ``__dict__``, created on first use.
+_UNSET_SLOTS = ("is_in", "x", "y", "z", *DIRECTIONS)
+_MISSING = object()
+_DEFAULTS = {
+    "properties": None,
+    "carry": 0,
+    "size": 0,
+    "is_thing": True,
+    **{flag: False for flag in FLAGS},
+}
+_DEFAULT_ITEMS = tuple(_DEFAULTS.items())
 
 
-@dataclass(eq=False)
 class Entity:
-    name: str
-    properties: Dict[str, Any] | None = None
-    carry: int = 0
-    size: int = 0
-    is_thing: bool = True
-
-    def __post_init__(self) -> None:
-        if self.properties:
-            for key, value in self.properties.items():
+    __slots__ = ("name", *_DEFAULTS, *_UNSET_SLOTS, "_world", "__dict__")
+
+    def __init__(
+        self,
+        name: str,
+        properties: Dict[str, Any] | None = None,
+        carry: int = 0,
+        size: int = 0,
+        is_thing: bool = True,
+    ):
+        # Not in a world yet, so nothing to notify.
+        set_ = object.__setattr__
+        set_(self, "_world", None)
+        for key, value in _DEFAULT_ITEMS:
+            set_(self, key, value)
+        set_(self, "name", name)
+        set_(self, "properties", properties)
+        set_(self, "carry", carry)
+        set_(self, "size", size)
+        set_(self, "is_thing", is_thing)
+        if properties:
+            for key, value in properties.items():
                 setattr(self, key, value)
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        object.__setattr__(self, name, value)
+        # Entities created by a World report attribute changes so that its
+        # role indexes stay current.
+        world = self._world
+        if world is not None:
+            world._entity_changed(self, name)
+
+    def __repr__(self) -> str:
+        return (
+            f"Entity(name={self.name!r}, properties={self.properties!r}, carry={self.carry!r}, "
+            f"size={self.size!r}, is_thing={self.is_thing!r})"
+        )
+
     def __str__(self) -> str:
         return self.name
 
+    def _items(self) -> Iterator[tuple[str, Any]]:
+        for name in ("name", *_DEFAULTS, *_UNSET_SLOTS):
+            try:
+                value = object.__getattribute__(self, name)
+            except AttributeError:
+                continue
+            default = _DEFAULTS.get(name, _MISSING)
+            if type(value) is not type(default) or value != default:
+                yield name, value
+        yield from getattr(self, "__dict__", {}).items()
+
+    def _state(self) -> dict[str, Any]:
+        """Every attribute that is set to a non-default value, without the world."""
+
+        return dict(self._items())
+
+    def __getstate__(self) -> dict[str, Any]:
+        # The world is left out, so that copying an entity does not copy the
+        # whole world; the world that owns the copy sets it again.
+        return self._state()
+
+    def __setstate__(self, attrs: dict[str, Any]) -> None:
+        set_ = object.__setattr__
+        set_(self, "_world", None)
+        for name, value in _DEFAULT_ITEMS:
+            set_(self, name, value)
+        for name, value in attrs.items():
+            set_(self, name, value)
+
     def can_hold(self, entity: "Entity") -> bool:
         return self.size >= self.carry + entity.size
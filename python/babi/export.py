@@ -0,0 +1,247 @@
+"""Pre-tokenized binary export of generated stories.
+
+A shard is a set of NumPy files sharing a path prefix::
+
+    <prefix>.tokens.npy            int32  token ids of every line, concatenated
+    <prefix>.line_offsets.npy      int64  start of each line in tokens (+ end)
+    <prefix>.story_offsets.npy     int64  first line of each story (+ end)
+    <prefix>.is_question.npy       uint8  1 for question lines
+    <prefix>.answers.npy           int32  answer token ids of every line
+    <prefix>.answer_offsets.npy    int64  start of each line in answers (+ end)
+    <prefix>.support.npy           int32  supporting line numbers (1-based, per story)
+    <prefix>.support_offsets.npy   int64  start of each line in support (+ end)
+    <prefix>.vocab.json                   the vocabulary
+
+``BinaryDataset`` memory-maps a shard for zero-copy access by story index.
+Requires NumPy.
+"""
+
+from __future__ import annotations
+
+import json
+from array import array
+from pathlib import Path
+from typing import Any, Iterable, NamedTuple
+
+from .actions import DIRECTIONS, NUMERIC_RELATIONS
+from .entity import FLAGS
+
+
+ARRAYS = (
+    "tokens",
+    "line_offsets",
+    "story_offsets",
+    "is_question",
+    "answers",
+    "answer_offsets",
+    "support",
+    "support_offsets",
+)
+
+
+class Vocabulary:
+    """Token to integer id mapping, seeded from the entities and actions of a world."""
+
+    SPECIALS = ("<pad>", "<unk>", "not", "?")
+    # Property names every world understands, and the words the Lua tasks
+    # use in questions and answers.
+    RELATIONS = ("is_in", "is_thing", *FLAGS, *sorted(NUMERIC_RELATIONS), *sorted(DIRECTIONS))
+    QUESTION_WORDS = ("eval", "yes", "no", "maybe", "nothing")
+
+    def __init__(self, tokens: Iterable[str] = (), frozen: bool = False):
+        self.tokens: list[str] = []
+        self.ids: dict[str, int] = {}
+        self.frozen = False
+        for token in (*self.SPECIALS, *tokens):
+            self.add(token)
+        # A frozen vocabulary maps unknown tokens to <unk> instead of growing.
+        self.frozen = frozen
+
+    @classmethod
+    def from_world(cls, world: Any, frozen: bool = False, extra: Iterable[str] = ()) -> "Vocabulary":
+        """Names of the entities, actions and properties of ``world``, the
+        values its entities hold, ``RELATIONS``, ``QUESTION_WORDS`` and
+        ``extra``.
+
+        Frozen, it covers every story whose clauses only use these words;
+        add task-specific question words through ``extra``.
+        """
+
+        tokens = [entity.name for entity in world.entities.values()]
+        tokens += [str(action) for action in world.actions.values()]
+        tokens += [*cls.RELATIONS, *cls.QUESTION_WORDS]
+        for entity in world.entities.values():
+            for prop, value in entity._state().items():
+                if prop in ("name", "properties"):
+                    continue
+                tokens.append(prop)
+                if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+                    tokens += _words(value)
+        return cls([*tokens, *extra], frozen)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def add(self, token: str) -> int:
+        i = self.ids.get(token)
+        if i is None:
+            if self.frozen:
+                return self.ids["<unk>"]
+            i = len(self.tokens)
+            self.tokens.append(token)
+            self.ids[token] = i
+        return i
+
+    def encode(self, tokens: Iterable[str]) -> list[int]:
+        return [self.add(token) for token in tokens]
+
+    def decode(self, ids: Iterable[int]) -> list[str]:
+        return [self.tokens[int(i)] for i in ids]
+
+    def save(self, path: str | Path) -> None:
+        Path(path).write_text(json.dumps(self.tokens), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Vocabulary":
+        vocab = cls()
+        vocab.tokens = json.loads(Path(path).read_text(encoding="utf-8"))
+        vocab.ids = {token: i for i, token in enumerate(vocab.tokens)}
+        vocab.frozen = True
+        return vocab
+
+
+def _words(value: Any) -> list[str]:
+    if value is None:
+        return []
+    if hasattr(value, "name"):
+        return [value.name]
+    if hasattr(value, "truth_value") and hasattr(value, "actor") and hasattr(value, "action"):
+        return clause_words(value)
+    if isinstance(value, str):
+        return value.split()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [word for item in value for word in _words(item)]
+    return [str(value)]
+
+
+def clause_words(clause: Any) -> list[str]:
+    words = [] if clause.truth_value else ["not"]
+    return words + [clause.actor.name, str(clause.action)] + _words(clause.args)
+
+
+class TokenizedLine(NamedTuple):
+    tokens: list[int]
+    is_question: bool
+    answer: list[int]
+    support: list[int]
+
+
+def tokenize_story(story: list[Any], vocab: Vocabulary) -> list[TokenizedLine]:
+    """Token ids of every line of a story, in the same order as ``render_lines``."""
+
+    line_of = {id(item): idx for idx, item in enumerate(story, start=1)}
+    lines = []
+    for item in story:
+        if hasattr(item, "truth_value") and hasattr(item, "actor") and hasattr(item, "action"):
+            lines.append(TokenizedLine(vocab.encode(clause_words(item)), False, [], []))
+        elif hasattr(item, "kind"):
+            words = _words(item.kind) + _words(getattr(item, "args", None)) + ["?"]
+            support = sorted(line_of[id(fact)] for fact in getattr(item, "support", None) or [] if id(fact) in line_of)
+            answer = vocab.encode(_words(getattr(item, "answer", None)))
+            lines.append(TokenizedLine(vocab.encode(words), True, answer, support))
+    return lines
+
+
+class BinaryShardWriter:
+    """Accumulate tokenized stories and write them as one shard on ``close``."""
+
+    def __init__(self, prefix: str | Path, vocab: Vocabulary):
+        self.prefix = Path(prefix)
+        self.vocab = vocab
+        self.tokens = array("i")
+        self.line_offsets = array("q", [0])
+        self.story_offsets = array("q", [0])
+        self.is_question = array("B")
+        self.answers = array("i")
+        self.answer_offsets = array("q", [0])
+        self.support = array("i")
+        self.support_offsets = array("q", [0])
+
+    def write(self, story: list[Any], knowledge: Any = None) -> None:
+        for line in tokenize_story(story, self.vocab):
+            self.tokens.extend(line.tokens)
+            self.line_offsets.append(len(self.tokens))
+            self.is_question.append(line.is_question)
+            self.answers.extend(line.answer)
+            self.answer_offsets.append(len(self.answers))
+            self.support.extend(line.support)
+            self.support_offsets.append(len(self.support))
+        self.story_offsets.append(len(self.is_question))
+
+    def close(self) -> None:
+        import numpy as np
+
+        self.prefix.parent.mkdir(parents=True, exist_ok=True)
+        dtypes = {"i": np.int32, "q": np.int64, "B": np.uint8}
+        for name in ARRAYS:
+            values = getattr(self, name)
+            np.save(shard_file(self.prefix, name), np.frombuffer(values, dtype=dtypes[values.typecode]))
+        self.vocab.save(shard_file(self.prefix, "vocab"))
+
+    def __enter__(self) -> "BinaryShardWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def shard_file(prefix: str | Path, name: str) -> Path:
+    suffix = ".json" if name == "vocab" else ".npy"
+    return Path(f"{prefix}.{name}{suffix}")
+
+
+class TokenizedStory(NamedTuple):
+    lines: list[Any]
+    is_question: Any
+    answers: list[Any]
+    supports: list[Any]
+
+
+class BinaryDataset:
+    """Random access to the stories of one binary shard through ``mmap``."""
+
+    def __init__(self, prefix: str | Path):
+        import numpy as np
+
+        for name in ARRAYS:
+            setattr(self, name, np.load(shard_file(prefix, name), mmap_mode="r"))
+        self.vocab = Vocabulary.load(shard_file(prefix, "vocab"))
+
+    def __len__(self) -> int:
+        return len(self.story_offsets) - 1
+
+    def __getitem__(self, i: int) -> TokenizedStory:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("story index out of range")
+        first, last = int(self.story_offsets[i]), int(self.story_offsets[i + 1])
+        lines, answers, supports = [], [], []
+        for j in range(first, last):
+            lines.append(self.tokens[self.line_offsets[j] : self.line_offsets[j + 1]])
+            answers.append(self.answers[self.answer_offsets[j] : self.answer_offsets[j + 1]])
+            supports.append(self.support[self.support_offsets[j] : self.support_offsets[j + 1]])
+        return TokenizedStory(lines, self.is_question[first:last], answers, supports)
+
+    def decode(self, i: int) -> list[str]:
+        """The story as text lines, for inspection."""
+
+        story = self[i]
+        lines = []
+        for idx, (tokens, question) in enumerate(zip(story.lines, story.is_question), start=1):
+            line = f"{idx} " + " ".join(self.vocab.decode(tokens))
+            if question:
+                answer = ",".join(self.vocab.decode(story.answers[idx - 1]))
+                line += f"\t{answer}\t" + " ".join(str(int(s)) for s in story.supports[idx - 1])
+            lines.append(line)
+        return lines
@@ -0,0 +1,479 @@
+"""Bulk dataset generation for the Python port.
+
+Usage::
+
+    python -m babi.generate task [number] [output_file] [--seed N] [--workers N]
+        [--shard-size N] [--shard-dir DIR] [--binary] [--unique] [--exclude SPLIT ...]
+        [--bloom-error RATE] [--profile] [--profile-memory] [--option value ...]
+
+Mirrors the Lua ``babi-tasks`` driver. ``task`` is either a task number, a
+class name looked up as ``babi.tasks.<Name>``, or an import path such as
+``mypackage.tasks:WhereIsActor``. The engine ships no ``babi.tasks`` package,
+so numbers and bare names only resolve where one is installed; tasks that
+cannot be loaded are reported as usage errors. Every story is generated from its own seed,
+derived from the master seed and the story index, so the output is
+byte-identical for any number of workers. With ``--binary`` each shard is
+written as pre-tokenized NumPy arrays (see ``babi.export``) instead of text.
+
+With ``--unique`` no story is repeated, and with ``--exclude SPLIT`` no story
+of an existing split is produced (the latter implies the former). Stories are
+compared by ``babi.digest.story_digest``; a colliding story is resampled
+from the next seed of its index, so unique output is still independent of
+the number of workers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import importlib
+import io
+import random
+import sys
+import time
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Iterator, TextIO
+
+from . import profiling
+from .datastats import BloomFilter, load_seen
+from .digest import story_digest
+from .stringify import StoryWriter
+from .task import MAX_ATTEMPTS, Task
+
+
+TASK_NAMES = {
+    1: "WhereIsActor",
+    2: "WhereIsObject",
+    3: "WhereWasObject",
+    4: "IsDir",
+    5: "WhoWhatGave",
+    6: "IsActorThere",
+    7: "Counting",
+    8: "Listing",
+    9: "Negation",
+    10: "Indefinite",
+    11: "BasicCoreference",
+    12: "Conjunction",
+    13: "CompoundCoreference",
+    14: "Time",
+    15: "Deduction",
+    16: "Induction",
+    17: "PositionalReasoning",
+    18: "Size",
+    19: "PathFinding",
+    20: "Motivations",
+}
+
+BUFFER_SIZE = 1 << 20
+
+
+def load_task(spec: str | Task | type[Task]) -> Task:
+    if isinstance(spec, Task):
+        return spec
+    if isinstance(spec, type):
+        return spec()
+    if spec.isdigit():
+        if int(spec) not in TASK_NAMES:
+            raise ValueError(f"unknown task number {spec}; tasks are numbered 1 to {len(TASK_NAMES)}")
+        spec = TASK_NAMES[int(spec)]
+    if ":" in spec:
+        module_name, class_name = spec.split(":", 1)
+    else:
+        module_name, class_name = f"babi.tasks.{spec}", spec
+    try:
+        module = importlib.import_module(module_name)
+    except ModuleNotFoundError as error:
+        # Only a missing task module is the caller's error; anything missing
+        # while importing it is re-raised.
+        if error.name is None or not (module_name + ".").startswith(error.name + "."):
+            raise
+        raise ValueError(f"cannot load task {spec}: no module {module_name}; pass module:Class") from None
+    task_class = getattr(module, class_name, None)
+    if task_class is None:
+        raise ValueError(f"cannot load task {spec}: {module_name} has no {class_name}")
+    return task_class()
+
+
+def task_config(task: Task, config: dict[str, Any] | None = None) -> dict[str, Any]:
+    return {**getattr(task, "DEFAULT_CONFIG", {}), **(config or {})}
+
+
+def story_seed(seed: int, index: int, attempt: int = 0) -> int:
+    key = f"{seed}:{index}" if attempt == 0 else f"{seed}:{index}:{attempt}"
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def generate_story(task: Task, config: dict[str, Any], seed: int) -> str:
+    random.seed(seed)
+    with profiling.story():
+        for _ in range(MAX_ATTEMPTS):
+            story = task.generate(dict(config))
+            if story:
+                return story
+            _restart()
+    raise _no_story(task)
+
+
+def sample_story(task: Task, config: dict[str, Any], seed: int):
+    """Story objects for ``seed``, consuming the same draws as ``generate_story``."""
+
+    random.seed(seed)
+    with profiling.story():
+        for _ in range(MAX_ATTEMPTS):
+            story, knowledge = task.sample(dict(config))
+            if story:
+                return story, knowledge
+            _restart()
+    raise _no_story(task)
+
+
+def _restart() -> None:
+    if profiling.active is not None:
+        profiling.active.count("story.restarts")
+
+
+def _no_story(task: Task) -> RuntimeError:
+    return RuntimeError(f"{type(task).__name__} produced no story in {MAX_ATTEMPTS} attempts")
+
+
+def generate_stories(task: Task, config: dict[str, Any], seed: int, start: int, stop: int) -> Iterator[str]:
+    for index in range(start, stop):
+        yield generate_story(task, config, story_seed(seed, index))
+
+
+def shard_ranges(number: int, shard_size: int) -> list[tuple[int, int]]:
+    return [(start, min(start + shard_size, number)) for start in range(0, number, shard_size)]
+
+
+def shard_path(shard_dir: str | Path, task_name: str, shard: int, binary: bool = False) -> Path:
+    return Path(shard_dir) / f"{task_name}.{shard:05d}{'' if binary else '.txt'}"
+
+
+_worker: dict[str, Any] = {}
+
+
+def _init_worker(
+    task: Task,
+    config: dict[str, Any],
+    seed: int,
+    exclude: Any = None,
+    trace_memory: bool | None = None,
+    vocab: Any = None,
+) -> None:
+    _worker.update(task=task, config=config, seed=seed, exclude=exclude or (), vocab=vocab)
+    if trace_memory is not None:
+        profiling.enable(profiling.Profile(trace_memory))
+
+
+def _pool(
+    workers: int, task: Task, config: dict[str, Any], seed: int, exclude: Any = None, vocab: Any = None
+) -> Pool:
+    # Workers profile when the caller does; see ``_imap``.
+    trace_memory = profiling.active.trace_memory if profiling.active is not None else None
+    return Pool(workers, initializer=_init_worker, initargs=(task, config, seed, exclude, trace_memory, vocab))
+
+
+def _profiled(job: tuple[Any, Any]) -> tuple[Any, profiling.Profile]:
+    fn, arg = job
+    return fn(arg), profiling.collect()
+
+
+def _imap(pool: Pool, fn, jobs: list) -> Iterator:
+    """``pool.imap`` that merges the workers' profiles into the active one."""
+
+    profile = profiling.active
+    if profile is None:
+        yield from pool.imap(fn, jobs)
+        return
+    for result, stats in pool.imap(_profiled, [(fn, job) for job in jobs]):
+        profile.merge(stats)
+        yield result
+
+
+def _unique_story(index: int, attempt: int, taken: Any) -> tuple[str, int, int]:
+    """First story of ``index`` from ``attempt`` on that is neither taken nor excluded."""
+
+    task, config, seed, exclude = _worker["task"], _worker["config"], _worker["seed"], _worker["exclude"]
+    for attempt in range(attempt, MAX_ATTEMPTS):
+        text = generate_story(task, config, story_seed(seed, index, attempt))
+        digest = story_digest(text)
+        if digest not in taken and digest not in exclude:
+            return text, digest, attempt
+        if profiling.active is not None:
+            profiling.active.count("story.duplicates")
+    raise RuntimeError(f"no unique story for index {index} after {MAX_ATTEMPTS} attempts")
+
+
+def _sample_unique_shard(bounds: tuple[int, int]) -> list[tuple[str, int, int]]:
+    """Stories of a shard, unique within the shard and outside the excluded split."""
+
+    taken: set[int] = set()
+    stories = []
+    for index in range(*bounds):
+        story = _unique_story(index, 0, taken)
+        taken.add(story[1])
+        stories.append(story)
+    return stories
+
+
+def _merge_unique(bounds: tuple[int, int], stories: list[tuple[str, int, int]], seen: Any) -> Iterator[str]:
+    # Shards are merged in order, so which of two colliding shards resamples
+    # does not depend on the workers.
+    for index, (text, digest, attempt) in zip(range(*bounds), stories):
+        if digest in seen:
+            text, digest, attempt = _unique_story(index, attempt + 1, seen)
+        seen.add(digest)
+        yield text
+
+
+def _stream_shard(bounds: tuple[int, int], sink: TextIO) -> None:
+    # Stories are rendered line by line into the writer's buffer; only
+    # unique output needs whole story strings, to digest them.
+    task, config, seed = _worker["task"], _worker["config"], _worker["seed"]
+    with StoryWriter(sink, BUFFER_SIZE) as writer:
+        for index in range(*bounds):
+            story, knowledge = sample_story(task, config, story_seed(seed, index))
+            if profiling.active is None:
+                writer.write(story, knowledge, config)
+            else:
+                with profiling.active.timer("render"):
+                    writer.write(story, knowledge, config)
+
+
+def _render_shard(bounds: tuple[int, int]) -> str:
+    buffer = io.StringIO()
+    _stream_shard(bounds, buffer)
+    return buffer.getvalue()
+
+
+def _write_shard(job: tuple[int, tuple[int, int], str, str, bool]) -> str:
+    shard, bounds, shard_dir, task_name, binary = job
+    path = shard_path(shard_dir, task_name, shard, binary)
+    if binary:
+        _write_binary_shard(bounds, path)
+        return str(path)
+    with open(path, "w", encoding="utf-8", buffering=BUFFER_SIZE) as handle:
+        _stream_shard(bounds, handle)
+    return str(path)
+
+
+def _write_binary_shard(bounds: tuple[int, int], prefix: Path) -> None:
+    from .export import BinaryShardWriter
+
+    task, config, seed = _worker["task"], _worker["config"], _worker["seed"]
+    # Every shard shares the frozen vocabulary built by ``write_dataset``.
+    writer = BinaryShardWriter(prefix, _worker["vocab"])
+    for index in range(*bounds):
+        story, knowledge = sample_story(task, config, story_seed(seed, index))
+        if profiling.active is None:
+            writer.write(story, knowledge)
+        else:
+            with profiling.active.timer("render"):
+                writer.write(story, knowledge)
+    writer.close()
+
+
+def _write_unique(
+    task: Task,
+    config: dict[str, Any],
+    seed: int,
+    ranges: list[tuple[int, int]],
+    output: TextIO,
+    shard_dir: str | Path | None,
+    workers: int,
+    exclude: Any,
+    seen: Any,
+) -> list[str]:
+    _init_worker(task, config, seed, exclude)
+    if workers <= 1:
+        shards = map(_sample_unique_shard, ranges)
+        return _write_merged(type(task).__name__, ranges, shards, output, shard_dir, seen)
+    with _pool(workers, task, config, seed, exclude) as pool:
+        shards = _imap(pool, _sample_unique_shard, ranges)
+        return _write_merged(type(task).__name__, ranges, shards, output, shard_dir, seen)
+
+
+def _write_merged(
+    task_name: str,
+    ranges: list[tuple[int, int]],
+    shards: Iterator[list[tuple[str, int, int]]],
+    output: TextIO,
+    shard_dir: str | Path | None,
+    seen: Any,
+) -> list[str]:
+    paths = []
+    for shard, (bounds, stories) in enumerate(zip(ranges, shards)):
+        if shard_dir is None:
+            with StoryWriter(output, BUFFER_SIZE) as writer:
+                for text in _merge_unique(bounds, stories, seen):
+                    writer.write_text(text)
+            continue
+        path = shard_path(shard_dir, task_name, shard)
+        with open(path, "w", encoding="utf-8", buffering=BUFFER_SIZE) as handle, StoryWriter(handle) as writer:
+            for text in _merge_unique(bounds, stories, seen):
+                writer.write_text(text)
+        paths.append(str(path))
+    return paths
+
+
+def write_dataset(
+    task: str | Task | type[Task],
+    number: int,
+    output: TextIO | None = None,
+    config: dict[str, Any] | None = None,
+    seed: int = 0,
+    workers: int = 1,
+    shard_size: int = 1000,
+    shard_dir: str | Path | None = None,
+    binary: bool = False,
+    unique: bool = False,
+    exclude: Any = None,
+    seen: Any = None,
+    profile: profiling.Profile | None = None,
+    vocab: Any = None,
+) -> list[str]:
+    """Generate ``number`` stories of ``task``.
+
+    Stories are grouped in shards of ``shard_size``. Without ``shard_dir``
+    shards are written to ``output`` in order; otherwise each worker writes
+    its shards to ``shard_dir`` and the shard paths are returned. ``binary``
+    shards are path prefixes of ``babi.export`` file sets, all tokenized
+    with one frozen ``vocab`` (by default ``Vocabulary.from_world`` of a new
+    world of the task), which is also saved as ``<task>.vocab.json``.
+
+    With ``unique`` every story is distinct, and none has a digest in
+    ``exclude`` (a set or ``BloomFilter``, see ``babi.datastats.load_seen``).
+    Digests of the written stories are collected in ``seen`` (a new set by
+    default), which may be passed on as ``exclude`` for the next split.
+
+    Stats of every process are collected into ``profile`` if given.
+    """
+
+    if profile is not None:
+        with profiling.enabled(profile):
+            return write_dataset(
+                task, number, output, config, seed, workers, shard_size, shard_dir, binary, unique, exclude, seen,
+                vocab=vocab,
+            )
+
+    if binary and shard_dir is None:
+        raise ValueError("binary output needs a shard directory")
+    unique = unique or exclude is not None or seen is not None
+    if binary and unique:
+        raise ValueError("unique stories are only supported for text output")
+    task = load_task(task)
+    config = task_config(task, config)
+    ranges = shard_ranges(number, shard_size)
+    task_name = type(task).__name__
+    if shard_dir is not None:
+        Path(shard_dir).mkdir(parents=True, exist_ok=True)
+        jobs = [(i, bounds, str(shard_dir), task_name, binary) for i, bounds in enumerate(ranges)]
+    if binary:
+        from .export import Vocabulary
+
+        if vocab is None:
+            vocab = Vocabulary.from_world(task.new_world(dict(config)), frozen=True)
+        elif not vocab.frozen:
+            # Every worker would grow its own copy and assign different ids.
+            raise ValueError("binary output needs a frozen vocabulary")
+        vocab.save(Path(shard_dir) / f"{task_name}.vocab.json")
+    output = output or sys.stdout
+
+    if unique:
+        seen = set() if seen is None else seen
+        return _write_unique(task, config, seed, ranges, output, shard_dir, workers, exclude, seen)
+
+    if workers <= 1:
+        _init_worker(task, config, seed, vocab=vocab)
+        if shard_dir is not None:
+            return [_write_shard(job) for job in jobs]
+        for bounds in ranges:
+            _stream_shard(bounds, output)
+        return []
+
+    with _pool(workers, task, config, seed, vocab=vocab) as pool:
+        if shard_dir is not None:
+            return list(_imap(pool, _write_shard, jobs))
+        for text in _imap(pool, _render_shard, ranges):
+            output.write(text)
+    return []
+
+
+def _parse_value(value: str) -> Any:
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_args(argv: list[str] | None = None) -> tuple[argparse.Namespace, dict[str, Any]]:
+    parser = argparse.ArgumentParser(prog="python -m babi.generate", description="Generate bAbI stories.")
+    parser.add_argument("task", help="task number, class name or module:Class")
+    parser.add_argument("number", nargs="?", type=int, default=1)
+    parser.add_argument("output_file", nargs="?")
+    parser.add_argument("--seed", type=int, default=None, help="master seed (defaults to the current time)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--shard-size", type=int, default=1000)
+    parser.add_argument("--shard-dir", default=None, help="write one file per shard into this directory")
+    parser.add_argument("--binary", action="store_true", help="write pre-tokenized NumPy shards (needs --shard-dir)")
+    parser.add_argument("--unique", action="store_true", help="resample stories that were already generated")
+    parser.add_argument(
+        "--exclude", action="append", default=None, help="file, shard directory or glob of a split to stay disjoint from"
+    )
+    parser.add_argument(
+        "--bloom-error", type=float, default=None, help="track digests in Bloom filters with this false positive rate"
+    )
+    parser.add_argument("--profile", action="store_true", help="print generation counters and timings to stderr")
+    parser.add_argument("--profile-memory", action="store_true", help="with --profile, trace peak memory per story")
+    args, extra = parser.parse_known_args(argv)
+
+    # Remaining ``--option value`` pairs are task options, as in babi-tasks.
+    config = {}
+    for flag, value in zip(extra[::2], extra[1::2]):
+        if not flag.startswith("--"):
+            parser.error(f"unexpected argument {flag}")
+        config[flag[2:].replace("-", "_")] = _parse_value(value)
+    if len(extra) % 2:
+        parser.error(f"missing value for {extra[-1]}")
+    try:
+        args.task = load_task(args.task)
+    except ValueError as error:
+        parser.error(str(error))
+    return args, config
+
+
+def main(argv: list[str] | None = None) -> None:
+    args, config = parse_args(argv)
+    seed = int(time.time()) if args.seed is None else args.seed
+    exclude = seen = None
+    if args.exclude:
+        exclude = load_seen(args.exclude, args.bloom_error)
+    if args.bloom_error is not None and (args.unique or args.exclude):
+        seen = BloomFilter(args.number, args.bloom_error)
+    options = dict(
+        config=config,
+        seed=seed,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        shard_dir=args.shard_dir,
+        binary=args.binary,
+        unique=args.unique,
+        exclude=exclude,
+        seen=seen,
+        profile=profiling.Profile(args.profile_memory) if args.profile or args.profile_memory else None,
+    )
+    if args.output_file and args.shard_dir is None:
+        with open(args.output_file, "a", encoding="utf-8", buffering=BUFFER_SIZE) as output:
+            write_dataset(args.task, args.number, output, **options)
+    else:
+        write_dataset(args.task, args.number, sys.stdout, **options)
+    if options["profile"] is not None:
+        print(options["profile"].report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,167 +1,809 @@
 from __future__ import annotations
 
-from copy import deepcopy
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from collections.abc import MutableMapping
 from dataclasses import dataclass, field
-from typing import Any
+from typing import Any, Iterable, Iterator
+
+from . import profiling
+from .support import ClauseRegistry, Support
+
+
+class PropertyIndex:
+    """Immutable list of facts about one property, indexed by truth value.
+
+    ``true`` maps a value to its first true fact and ``false`` to its last
+    false fact; ``last_true`` and ``other_true`` are the last true fact and
+    the last true fact with a different value, which is all the exclusive
+    inference in ``is_false`` needs. Facts are stored as ``(position, fact)``
+    so that ties resolve to the latest fact, like a linear scan would.
+    """
+
+    __slots__ = ("facts", "true", "false", "last_true", "other_true", "_values")
+
+    def __init__(self, facts: Iterable[dict[str, Any]] = ()):
+        self.facts = tuple(facts)
+        self.true: dict[Any, tuple[int, dict[str, Any]]] = {}
+        self.false: dict[Any, tuple[int, dict[str, Any]]] = {}
+        self.last_true: tuple[int, dict[str, Any]] | None = None
+        self.other_true: tuple[int, dict[str, Any]] | None = None
+        self._values: tuple[list[Any], list[int]] | None = None
+        for i, fact in enumerate(self.facts):
+            value = fact["value"]
+            if fact["truth_value"]:
+                self.true.setdefault(value, (i, fact))
+                if self.last_true is not None and self.last_true[1]["value"] != value:
+                    self.other_true = self.last_true
+                self.last_true = (i, fact)
+            else:
+                self.false[value] = (i, fact)
+
+    def exclusive_true(self, value: Any) -> tuple[int, dict[str, Any]] | None:
+        """Last true fact whose value differs from ``value``."""
+
+        if self.last_true is None or self.last_true[1]["value"] != value:
+            return self.last_true
+        return self.other_true
+
+    def values(self) -> tuple[list[Any], list[int]]:
+        if self._values is None:
+            vals, masks = [], []
+            for fact in self.facts:
+                if fact["value"] in self.true:
+                    vals.append(fact["value"])
+                    masks.append(fact["support"])
+            self._values = (vals, masks)
+        return self._values
+
+
+_EMPTY = PropertyIndex()
+
+
+class FactsView(MutableMapping):
+    """List-of-dicts view of ``EntityProperties`` kept for existing callers.
+
+    Reading a property returns a new list of its facts, so changing that list
+    leaves the knowledge alone; assigning a list of facts re-indexes the
+    property.
+    """
+
+    def __init__(self, owner: "EntityProperties"):
+        self._owner = owner
+
+    def __getitem__(self, prop: str) -> list[dict[str, Any]]:
+        return list(self._owner.props[prop].facts)
+
+    def __setitem__(self, prop: str, facts: Iterable[dict[str, Any]]) -> None:
+        self._owner._store(prop, PropertyIndex(facts))
+
+    def __delitem__(self, prop: str) -> None:
+        self._owner._store(prop, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._owner.props)
+
+    def __len__(self) -> int:
+        return len(self._owner.props)
 
 
 @dataclass
 class EntityProperties:
+    """Facts known about one entity.
+
+    Each property holds ``{"value", "truth_value", "support"}`` dicts in a
+    ``PropertyIndex``, where ``support`` is a bitmask over the ``Knowledge``
+    clause registry. Query methods return supports as ``Support`` objects.
+    """
+
     knowledge: "Knowledge"
-    values: dict[str, list[dict[str, Any]]] = field(default_factory=dict)
+    props: dict[str, PropertyIndex] = field(default_factory=dict)
+    # Set by the KnowledgeTable holding these properties, so that changes
+    # reach its reverse index.
+    entity: Any = field(default=None, repr=False, compare=False)
+    table: "KnowledgeTable | None" = field(default=None, repr=False, compare=False)
+
+    @property
+    def values(self) -> FactsView:
+        return FactsView(self)
+
+    def _store(self, prop: str, index: PropertyIndex | None) -> None:
+        old = self.props.get(prop)
+        if index is None:
+            if old is None:
+                return
+            del self.props[prop]
+        else:
+            self.props[prop] = index
+        table = self.table
+        if table is not None:
+            if table.index is not None:
+                table.index.update(self.entity, prop, index)
+            if table.t is not None:
+                knowledge = self.knowledge
+                knowledge._record_change(self.entity, prop, table.t, index)
+                delta = knowledge._delta
+                if delta is not None and (old is None or index is None or old.facts != index.facts):
+                    delta.add((self.entity, prop))
+
+    def _facts(self, prop: str) -> tuple[dict[str, Any], ...]:
+        return self.props.get(prop, _EMPTY).facts
 
-    def add(self, prop: str, value: Any, truth_value: bool, support: set[Any]) -> None:
-        self.values.setdefault(prop, [])
-        self.values[prop] = [
+    def add(self, prop: str, value: Any, truth_value: bool, support: Any) -> None:
+        exclusive = self.knowledge.exclusive.get(prop, False) and truth_value
+        facts = [
             item
-            for item in self.values[prop]
-            if not (
-                item["value"] == value
-                or (self.knowledge.exclusive.get(prop, False) and truth_value and item["truth_value"])
-            )
+            for item in self._facts(prop)
+            if not (item["value"] == value or (exclusive and item["truth_value"]))
         ]
-        self.values[prop].append({"value": value, "truth_value": truth_value, "support": set(support)})
+        facts.append({"value": value, "truth_value": truth_value, "support": self.knowledge.registry.mask(support)})
+        self._store(prop, PropertyIndex(facts))
 
-    def set(self, prop: str, value: Any, truth_value: bool, support: set[Any]) -> None:
-        self.values[prop] = [{"value": value, "truth_value": truth_value, "support": set(support)}]
+    def set(self, prop: str, value: Any, truth_value: bool, support: Any) -> None:
+        self._store(
+            prop,
+            PropertyIndex(
+                [{"value": value, "truth_value": truth_value, "support": self.knowledge.registry.mask(support)}]
+            ),
+        )
 
-    def merge(self, prop: str, values: list[dict[str, Any]], support: set[Any]) -> None:
+    def merge(self, prop: str, values: Iterable[dict[str, Any]], support: Any) -> None:
         self.rawadd(prop, values, support)
-        true_values = [v for v in self.values[prop] if v["truth_value"]]
-        if true_values:
-            self.values[prop] = [true_values[0]]
-
-    def rawset(self, prop: str, values: list[dict[str, Any]], support: set[Any] | None = None) -> None:
-        copied = deepcopy(values)
-        if support:
-            for value in copied:
-                value["support"] |= support
-        self.values[prop] = copied
-
-    def rawadd(self, prop: str, values: list[dict[str, Any]], support: set[Any] | None = None) -> None:
-        self.values.setdefault(prop, [])
-        copied = deepcopy(values)
-        if support:
-            for value in copied:
-                value["support"] |= support
-        self.values[prop].extend(copied)
+        index = self.props[prop]
+        if index.true:
+            first = min(index.true.values(), key=lambda item: item[0])
+            self._store(prop, PropertyIndex([first[1]]))
+
+    def _copy_facts(self, values: Iterable[dict[str, Any]], support: Any) -> list[dict[str, Any]]:
+        # Facts only hold entities and integer masks, so a shallow copy is a
+        # full copy and entity identity is preserved.
+        mask = self.knowledge.registry.mask(support)
+        return [{**value, "support": value["support"] | mask} for value in values]
+
+    def rawset(self, prop: str, values: Iterable[dict[str, Any]], support: Any = None) -> None:
+        self._store(prop, PropertyIndex(self._copy_facts(values, support)))
+
+    def rawadd(self, prop: str, values: Iterable[dict[str, Any]], support: Any = None) -> None:
+        self._store(prop, PropertyIndex(self._facts(prop) + tuple(self._copy_facts(values, support))))
+
+    def fork(self) -> "EntityProperties":
+        """Copy-on-write child sharing every property index with ``self``.
+
+        Property indexes are immutable, so only the mapping is copied.
+        """
+
+        return EntityProperties(self.knowledge, dict(self.props))
+
+    def _is_true(self, prop: str, value: Any) -> tuple[bool, int]:
+        fact = self.props.get(prop, _EMPTY).true.get(value)
+        return (True, fact[1]["support"]) if fact else (False, 0)
+
+    def _is_false(self, prop: str, value: Any) -> tuple[bool, int]:
+        index = self.props.get(prop, _EMPTY)
+        fact = index.false.get(value)
+        if self.knowledge.exclusive.get(prop, False):
+            other = index.exclusive_true(value)
+            if other is not None and (fact is None or other[0] > fact[0]):
+                fact = other
+        return (True, fact[1]["support"]) if fact else (False, 0)
 
     def is_true(self, prop: str, value: Any, return_support: bool = False):
-        truth, support = False, set()
-        for fact in self.values.get(prop, []):
-            if fact["value"] == value and fact["truth_value"]:
-                truth, support = True, fact["support"]
-                break
-        return (truth, support) if return_support else truth
+        truth, support = self._is_true(prop, value)
+        return (truth, self.knowledge.support(support)) if return_support else truth
 
     def is_false(self, prop: str, value: Any, return_support: bool = False):
-        truth, support = False, set()
-        for fact in self.values.get(prop, []):
-            if fact["value"] == value and not fact["truth_value"]:
-                truth, support = True, fact["support"]
-            elif self.knowledge.exclusive.get(prop, False) and value != fact["value"] and fact["truth_value"]:
-                truth, support = True, fact["support"]
-        return (truth, support) if return_support else truth
+        truth, support = self._is_false(prop, value)
+        return (truth, self.knowledge.support(support)) if return_support else truth
 
     def get_truth_value(self, prop: str, value: Any, return_support: bool = False):
-        is_true, s1 = self.is_true(prop, value, True)
-        is_false, s2 = self.is_false(prop, value, True)
-        support = s1 | s2
+        is_true, s1 = self._is_true(prop, value)
+        is_false, s2 = self._is_false(prop, value)
+        support = self.knowledge.support(s1 | s2)
         if is_true or is_false:
             v = True if is_true else False
             return (v, support) if return_support else v
         return (None, support) if return_support else None
 
+    def get_exclusive_value(self, prop: str, return_support: bool = False):
+        """The latest true value of ``prop``, in O(1).
+
+        For exclusive properties this is the only value that can be true.
+        """
+
+        fact = self.props.get(prop, _EMPTY).last_true
+        if fact is None:
+            return (None, None) if return_support else None
+        value, support = fact[1]["value"], self.knowledge.support(fact[1]["support"])
+        return (value, support) if return_support else value
+
     def get_value(self, prop: str, return_support: bool = False):
-        values, support = self.get_values(prop, True)
+        values, masks = self.props.get(prop, _EMPTY).values()
         if len(values) > 1:
             raise ValueError("this property has multiple values")
         if len(values) == 1:
-            return (values[0], support[0]) if return_support else values[0]
+            return (values[0], self.knowledge.support(masks[0])) if return_support else values[0]
         return (None, None) if return_support else None
 
     def get_values(self, prop: str, return_support: bool = False):
-        vals, supports = [], []
-        for value in self.values.get(prop, []):
-            if self.is_true(prop, value["value"]):
-                vals.append(value["value"])
-                supports.append(value["support"])
-        return (vals, supports) if return_support else vals
+        values, masks = self.props.get(prop, _EMPTY).values()
+        if return_support:
+            return list(values), [self.knowledge.support(mask) for mask in masks]
+        return list(values)
 
     def get_non_values(self, prop: str, return_support: bool = False):
         vals, supports = [], []
-        for value in self.values.get(prop, []):
-            if self.is_false(prop, value["value"]):
+        for value in self._facts(prop):
+            if self._is_false(prop, value["value"])[0]:
                 vals.append(value["value"])
-                supports.append(value["support"])
+                supports.append(self.knowledge.support(value["support"]))
         return (vals, supports) if return_support else vals
 
 
+class ValueIndex:
+    """Reverse index property -> value -> entities with that true value.
+
+    Kept up to date by the ``EntityProperties`` of the table that owns it.
+    """
+
+    def __init__(self) -> None:
+        self.entities: dict[str, dict[Any, dict[Any, None]]] = {}
+        # Entities whose property has more than one true value, for which
+        # ``get_value`` (and therefore ``find``) raises.
+        self.multi: dict[str, set[Any]] = {}
+        self.known: dict[Any, dict[str, tuple[Any, ...]]] = {}
+        self.order: dict[Any, int] = {}
+
+    def update(self, entity: Any, prop: str, index: PropertyIndex | None) -> None:
+        new = tuple(index.values()[0]) if index is not None else ()
+        known = self.known.setdefault(entity, {})
+        old = known.get(prop, ())
+        if old == new:
+            return
+        buckets = self.entities.setdefault(prop, {})
+        for value in old:
+            bucket = buckets.get(value)
+            if bucket is not None:
+                bucket.pop(entity, None)
+                if not bucket:
+                    del buckets[value]
+        for value in new:
+            buckets.setdefault(value, {})[entity] = None
+        known[prop] = new
+        if len(new) > 1:
+            self.multi.setdefault(prop, set()).add(entity)
+        else:
+            self.multi.get(prop, set()).discard(entity)
+
+    def add_entity(self, entity: Any, props: "EntityProperties") -> None:
+        self.order.setdefault(entity, len(self.order))
+        for prop in set(self.known.get(entity, ())) | set(props.props):
+            self.update(entity, prop, props.props.get(prop))
+
+    def find(self, prop: str, value: Any = None) -> list[Any]:
+        if self.multi.get(prop):
+            raise ValueError("this property has multiple values")
+        buckets = self.entities.get(prop, {})
+        if value is None:
+            matches = {entity: None for key, bucket in buckets.items() if key for entity in bucket}
+        elif value:
+            matches = buckets.get(value, {})
+        else:
+            return []
+        return sorted(matches, key=self.order.__getitem__)
+
+
 class KnowledgeTable(dict):
-    def __init__(self, knowledge: "Knowledge"):
+    """Knowledge about every entity at one step of the story.
+
+    A table created by ``Knowledge.update`` only stores the entities accessed
+    at its own step ``t``; everything else is inherited from the most recent
+    earlier snapshot and forked on first access.
+
+    ``index`` is the reverse index used by ``find``. ``Knowledge.update``
+    hands it from one step to the next, so only the newest table has one;
+    older tables fall back to a scan.
+    """
+
+    def __init__(self, knowledge: "Knowledge", t: int | None = None, index: ValueIndex | None = None):
         super().__init__()
         self.k = knowledge
+        self.t = t
+        self.index = index if index is not None or t is not None else ValueIndex()
 
     def __missing__(self, key: Any):
         if hasattr(key, "name"):
-            val = EntityProperties(self.k)
+            parent = self._inherited(key)
+            val = parent.fork() if parent is not None else EntityProperties(self.k)
             self[key] = val
             return val
         raise KeyError(f"Accessing unset key {key}")
 
+    def __setitem__(self, key: Any, value: Any) -> None:
+        super().__setitem__(key, value)
+        if isinstance(value, EntityProperties):
+            value.entity, value.table = key, self
+            if self.index is not None:
+                self.index.add_entity(key, value)
+        if self.t is not None:
+            if isinstance(value, EntityProperties):
+                # Forks share every index with their parent; anything else
+                # replaces properties wholesale and goes into the change log.
+                parent = self._inherited(key)
+                old = parent.props if parent is not None else {}
+                for prop in old.keys() | value.props.keys():
+                    if old.get(prop) is not value.props.get(prop):
+                        self.k._record_change(key, prop, self.t, value.props.get(prop))
+            self.k._record_version(key, self.t, value)
+
+    def _inherited(self, key: Any) -> "EntityProperties | None":
+        if self.t is None:
+            return None
+        return self.k._version(key, self.t - 1)
+
+    def _resolve(self, key: Any) -> "EntityProperties | None":
+        """Read-only lookup that does not fork inherited entries."""
+
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        return self._inherited(key)
+
+    def __contains__(self, key: object) -> bool:
+        return dict.__contains__(self, key) or self._inherited(key) is not None
+
+    def __iter__(self):
+        if self.t is None:
+            return dict.__iter__(self)
+        return iter(self.k._entities_at(self.t))
+
+    def __len__(self) -> int:
+        if self.t is None:
+            return dict.__len__(self)
+        return len(self.k._entities_at(self.t))
+
+    def keys(self):
+        return list(self) if self.t is not None else dict.keys(self)
+
+    def values(self):
+        return [self[key] for key in self] if self.t is not None else dict.values(self)
+
+    def items(self):
+        return [(key, self[key]) for key in self] if self.t is not None else dict.items(self)
+
+    def get(self, key: Any, default: Any = None):
+        return self[key] if key in self else default
+
+    @property
+    def delta(self) -> frozenset[tuple[Any, str]]:
+        """``(entity, property)`` pairs changed by the last round of the current update."""
+
+        return self.k.delta
+
     def find(self, prop: str, value: Any = None) -> list[Any]:
+        profile = profiling.active
+        if profile is not None:
+            profile.count("find.calls")
+            if self.index is None:
+                profile.count("find.scans")
+        if self.index is not None:
+            return self.index.find(prop, value)
         matches = []
         for entity in self.keys():
             if hasattr(entity, "name"):
-                entity_value = self[entity].get_value(prop)
+                entity_value = self._resolve(entity).get_value(prop)
                 if entity_value and (value is None or entity_value == value):
                     matches.append(entity)
         return matches
 
 
+def _lap(profile: profiling.Profile, name: str, start: float) -> float:
+    now = time.perf_counter()
+    profile.add_time(name, now - start)
+    return now
+
+
+class RetentionError(LookupError):
+    """A query reached a step that a ``Knowledge`` horizon has forgotten."""
+
+
+class _Tables(dict):
+    """Tables by step; reading a step builds the lazy steps up to it."""
+
+    def __init__(self, knowledge: "Knowledge"):
+        super().__init__()
+        self.k = knowledge
+
+    def __missing__(self, t: int):
+        self.k._check_retained(t)
+        if self.k._pending and self.k._pending[0] <= t:
+            self.k.materialize(t)
+            if dict.__contains__(self, t):
+                return dict.__getitem__(self, t)
+        raise KeyError(t)
+
+    def __contains__(self, t: object) -> bool:
+        pending = self.k._pending
+        return dict.__contains__(self, t) or isinstance(t, int) and bool(pending) and pending[0] <= t <= pending[-1]
+
+    def get(self, t: int, default: Any = None):
+        return self[t] if t in self else default
+
+    # Listing the steps builds all of them.
+    def __iter__(self):
+        self.k.materialize()
+        return dict.__iter__(self)
+
+    def __len__(self) -> int:
+        return dict.__len__(self) + len(self.k._pending)
+
+    def keys(self):
+        self.k.materialize()
+        return dict.keys(self)
+
+    def values(self):
+        self.k.materialize()
+        return dict.values(self)
+
+    def items(self):
+        self.k.materialize()
+        return dict.items(self)
+
+
+class RuleIndex:
+    """Rules by the actions and properties they are triggered by."""
+
+    def __init__(self, rules: list[Any], action_names: dict[int, str]):
+        self.size = 0
+        self.action_names = action_names
+        self.order: dict[int, int] = {}
+        self.always: list[Any] = []
+        self.by_action: dict[str, list[Any]] = {}
+        self.by_property: dict[str, list[Any]] = {}
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule: Any) -> None:
+        """Index ``rule`` after every rule added before it."""
+
+        self.order[id(rule)] = self.size
+        self.size += 1
+        actions = getattr(rule, "actions", None)
+        properties = getattr(rule, "properties", None)
+        if actions is None and properties is None:
+            self.always.append(rule)
+        for name in actions or ():
+            self.by_action.setdefault(name, []).append(rule)
+        for prop in properties or ():
+            self.by_property.setdefault(prop, []).append(rule)
+
+    def _sorted(self, rules: dict[int, Any]) -> list[Any]:
+        return [rules[key] for key in sorted(rules, key=self.order.__getitem__)]
+
+    def for_delta(self, delta: Iterable[tuple[Any, str]]) -> list[Any]:
+        rules = {}
+        for prop in {prop for _, prop in delta}:
+            for rule in self.by_property.get(prop, ()):
+                rules[id(rule)] = rule
+        return self._sorted(rules)
+
+    def for_clause(self, clause: Any, delta: Iterable[tuple[Any, str]]) -> list[Any]:
+        """Rules to test on ``clause``, which changed ``delta``, in registration order."""
+
+        rules = {id(rule): rule for rule in self.always}
+        if _is_rule(clause):
+            # A rule is always tested when it is added, like in Lua.
+            rules[id(clause)] = clause
+        action = getattr(clause, "action", None)
+        for name in (self.action_names.get(id(action)), str(action)):
+            for rule in self.by_action.get(name, ()):
+                rules[id(rule)] = rule
+        for rule in self.for_delta(delta):
+            rules[id(rule)] = rule
+        return self._sorted(rules)
+
+
+MAX_RULE_ROUNDS = 100
+
+
+def _is_rule(clause: Any) -> bool:
+    return hasattr(clause, "is_applicable") and hasattr(clause, "perform") and hasattr(clause, "update_knowledge")
+
+
 class Knowledge:
-    def __init__(self, world: Any, rules: list[Any] | None = None):
+    """Snapshots of what is known after every clause of a story.
+
+    With ``lazy``, ``update`` only logs the clause; the tables of logged
+    steps are built in order the first time a read reaches them. A read of
+    step t (``knowledge[t]``, ``get_value_at``, ``get_changes`` up to t)
+    builds the steps up to t and leaves the later ones pending, while
+    ``current()``, histories and listing ``knowledge`` build everything.
+    Stories that are rejected before their knowledge is read then skip that
+    work entirely, as do the steps after the last one a question reads. Rules run as soon as they are known, because ``Rule.perform``
+    changes the world, so a ``Knowledge`` with rules updates eagerly. Lazy
+    mode needs actions whose ``update_knowledge`` reads only the knowledge
+    and the clause, as all built-in actions do.
+
+    With a ``horizon`` of H, only the tables and clauses of the last H to
+    2H steps are kept (older ones are dropped every H steps, and the clause
+    registry is compacted to the clauses that retained facts still use), so
+    memory and the width of support masks stay bounded for long stories.
+    Values at retained steps are unchanged, but queries about forgotten
+    steps raise ``RetentionError``. ``forget`` drops steps explicitly.
+    """
+
+    def __init__(self, world: Any, rules: list[Any] | None = None, lazy: bool = False, horizon: int | None = None):
+        if horizon is not None and horizon < 1:
+            raise ValueError("horizon must be at least one step")
         self.t = 0
-        self.knowledge: dict[int, KnowledgeTable] = {}
+        self._tables: dict[int, KnowledgeTable] = _Tables(self)
+        self.lazy = lazy
+        self.horizon = horizon
+        # Steps before this one have been forgotten.
+        self._first = 1
+        # Steps logged by a lazy ``update`` whose tables are not built yet,
+        # in order.
+        self._pending: deque[int] = deque()
         self.world = world
         self.rules = rules or []
         self.story: dict[int, Any] = {}
         self.exclusive: dict[str, bool] = {}
+        # Supporting facts are bitmasks over this registry.
+        self.registry = ClauseRegistry()
+        # Per entity, the steps at which a snapshot stores its own properties
+        # and the matching ``EntityProperties``; used to resolve inherited
+        # entries in O(log T).
+        self._versions: dict[Any, tuple[list[int], list[EntityProperties]]] = {}
+        # Per (entity, property), the steps at which the property changed and
+        # its new index, for time queries in O(log T).
+        self._changes: dict[tuple[Any, str], tuple[list[int], list[PropertyIndex | None]]] = {}
+        self._rule_index: RuleIndex | None = None
+        # Properties changed during the current update while rules listen
+        # for them, and those of the last finished round.
+        self._delta: set[tuple[Any, str]] | None = None
+        self.delta: frozenset[tuple[Any, str]] = frozenset()
+
+    @property
+    def knowledge(self) -> dict[int, KnowledgeTable]:
+        return self._tables
+
+    def support(self, mask: int = 0) -> Support:
+        return Support(self.registry, mask)
+
+    @staticmethod
+    def _record_step(entry: tuple[list[int], list[Any]], t: int, item: Any) -> None:
+        steps, items = entry
+        if steps and steps[-1] < t:
+            steps.append(t)
+            items.append(item)
+            return
+        i = bisect_right(steps, t)
+        if i and steps[i - 1] == t:
+            items[i - 1] = item
+        else:
+            steps.insert(i, t)
+            items.insert(i, item)
+
+    def _record_version(self, entity: Any, t: int, props: EntityProperties) -> None:
+        self._record_step(self._versions.setdefault(entity, ([], [])), t, props)
+
+    def _record_change(self, entity: Any, prop: str, t: int, index: PropertyIndex | None) -> None:
+        self._record_step(self._changes.setdefault((entity, prop), ([], [])), t, index)
+
+    def _version(self, entity: Any, t: int) -> EntityProperties | None:
+        entry = self._versions.get(entity)
+        if entry is None:
+            return None
+        steps, versions = entry
+        i = bisect_right(steps, t)
+        return versions[i - 1] if i else None
+
+    def _index_at(self, entity: Any, prop: str, t: int) -> PropertyIndex:
+        steps, indexes = self._changes.get((entity, prop), ((), ()))
+        i = bisect_right(steps, t)
+        index = indexes[i - 1] if i else None
+        return index if index is not None else _EMPTY
+
+    def _check_retained(self, t: int) -> None:
+        if 1 <= t < self._first:
+            raise RetentionError(f"step {t} was forgotten; the first retained step is {self._first}")
+
+    def get_changes(self, entity: Any, prop: str, start: int = 1, stop: int | None = None) -> list[int]:
+        """Steps in ``[start, stop]`` (default: up to now) at which ``prop`` of ``entity`` changed."""
+
+        stop = self.t if stop is None else stop
+        self.materialize(stop)
+        self._check_retained(start)
+        steps = self._changes.get((entity, prop), ((), ()))[0]
+        return list(steps[bisect_left(steps, start) : bisect_right(steps, stop)])
+
+    def get_value_at(self, entity: Any, prop: str, t: int, return_support: bool = False):
+        """``get_value`` of ``prop`` as known at step ``t``, in O(log T).
+
+        The value before the event at step ``t`` is the value at ``t - 1``.
+        """
+
+        self.materialize(t)
+        self._check_retained(t)
+        values, masks = self._index_at(entity, prop, t).values()
+        if len(values) > 1:
+            raise ValueError("this property has multiple values")
+        if len(values) == 1:
+            return (values[0], self.support(masks[0])) if return_support else values[0]
+        return (None, None) if return_support else None
+
+    def _entities_at(self, t: int) -> list[Any]:
+        return [entity for entity, (steps, _) in self._versions.items() if steps[0] <= t]
+
+    def _history_steps(self, entity: Any, prop: str, resolve_location: bool, start: int) -> list[int]:
+        # The history can only change where the property changes, or, while
+        # it points at an actor, where the actor's own property changes.
+        events = {start, *self.get_changes(entity, prop, start)}
+        if resolve_location:
+            bounds = sorted(events) + [self.t + 1]
+            for start, stop in zip(bounds, bounds[1:]):
+                value = self.get_value_at(entity, prop, start)
+                if value is not None and getattr(value, "is_actor", False):
+                    events.update(self.get_changes(value, prop, start, stop - 1))
+        return sorted(events)
+
+    def get_value_history(self, entity: Any, prop: str, resolve_location: bool = True, start: int = 1):
+        """Distinct successive values of ``prop`` from step ``start`` on, in O(changes) lookups.
+
+        With ``resolve_location``, a value that is an actor is replaced by
+        the actor's own value of ``prop`` (where an object is held).
+        """
 
-    def get_value_history(self, entity: Any, prop: str, resolve_location: bool = True):
         value_history, support_history = [], []
-        for t in range(1, self.t + 1):
-            value, support = self.knowledge[t][entity].get_value(prop, True)
+        for t in self._history_steps(entity, prop, resolve_location, start):
+            value, support = self.get_value_at(entity, prop, t, True)
             if resolve_location and value is not None and getattr(value, "is_actor", False):
-                value, new_support = self.knowledge[t][value].get_value(prop, True)
+                value, new_support = self.get_value_at(value, prop, t, True)
                 if new_support:
-                    support = (support or set()) | new_support
+                    support = (support or self.support()) | new_support
             if value and (not value_history or value_history[-1].name != value.name):
                 value_history.append(value)
                 support_history.append(support)
         return value_history, support_history
 
     def update(self, clause: Any) -> None:
+        self.delta = frozenset()
         self.t += 1
         t = self.t
         self.story[t] = clause
+        self.registry.index(clause)
+        if self.lazy and not self.rules and not _is_rule(clause):
+            self._pending.append(t)
+            return
+        if self._pending:
+            self.materialize()
+        self._apply(t, clause)
+
+    def materialize(self, until: int | None = None) -> None:
+        """Build the tables of the steps logged by a lazy ``update``, up to ``until`` (default: all)."""
 
-        self.knowledge[t] = KnowledgeTable(self)
-        if t > 1:
-            for k, v in self.knowledge[t - 1].items():
-                copied = EntityProperties(self)
-                copied.values = deepcopy(v.values)
-                self.knowledge[t][k] = copied
+        pending = self._pending
+        while pending and (until is None or pending[0] <= until):
+            t = pending.popleft()
+            self._apply(t, self.story[t])
 
-        if hasattr(clause, "is_applicable") and hasattr(clause, "perform") and hasattr(clause, "update_knowledge"):
+    def _apply(self, t: int, clause: Any) -> None:
+        profile = profiling.active
+        if profile is not None:
+            profile.count("knowledge.updates")
+            start = time.perf_counter()
+
+        # Entries untouched at this step are shared with earlier snapshots,
+        # and so is the reverse index.
+        tables = self._tables
+        previous = dict.get(tables, t - 1)
+        index = previous.index if previous is not None and previous.index is not None else ValueIndex()
+        if previous is not None:
+            previous.index = None
+        table = tables[t] = KnowledgeTable(self, t, index)
+        if profile is not None:
+            start = _lap(profile, "knowledge.snapshot", start)
+
+        if _is_rule(clause):
             self.rules.append(clause)
+            self._delta = set()
         else:
-            clause.action.update_knowledge(self.world, self.knowledge[t], clause, clause.actor, *clause.args)
+            self._delta = set() if self.rules and self._rules().by_property else None
+            clause.action.update_knowledge(self.world, table, clause, clause.actor, *clause.args)
+        if profile is not None:
+            start = _lap(profile, "knowledge.update_knowledge", start)
+
+        if self.rules:
+            self._run_rules(clause, table)
+        self._delta = None
+        if profile is not None:
+            _lap(profile, "knowledge.rules", start)
+        if self.horizon is not None and t - self._first >= 2 * self.horizon:
+            self._forget(t - self.horizon + 1)
+
+    def _rules(self) -> RuleIndex:
+        index = self._rule_index
+        if index is None or index.size > len(self.rules):
+            names = {id(action): name for name, action in getattr(self.world, "actions", {}).items()}
+            index = self._rule_index = RuleIndex(self.rules, names)
+        # Rules are only ever appended, so the new ones are at the end.
+        for rule in self.rules[index.size :]:
+            index.add(rule)
+        return index
+
+    def _run_rules(self, clause: Any, table: KnowledgeTable) -> None:
+        # Semi-naive evaluation: the first round tests the rules triggered by
+        # the clause and what it changed; every further round only tests the
+        # rules listening to properties changed in the round before.
+        index = self._rules()
+        delta = self._delta or set()
+        rules = index.for_clause(clause, delta)
+        profile = profiling.active
+        for _ in range(MAX_RULE_ROUNDS):
+            if not rules:
+                return
+            self.delta = frozenset(delta)
+            self._delta = set() if index.by_property else None
+            for rule in rules:
+                if profile is not None:
+                    profile.count("rules.checked")
+                if rule.is_applicable(clause, table, self.story):
+                    if profile is not None:
+                        profile.count("rules.fired")
+                    rule.perform(self.world)
+                    rule.update_knowledge(self.world, table, clause)
+            delta = self._delta or set()
+            rules = index.for_delta(delta)
+        raise RuntimeError(f"rules did not reach a fixed point within {MAX_RULE_ROUNDS} rounds")
+
+    def forget(self, before: int) -> None:
+        """Drop the tables and clauses of every step before ``before``."""
+
+        before = min(before, self.t)
+        self.materialize(before)
+        self._forget(before)
+
+    def _forget(self, before: int) -> None:
+        for t in range(self._first, before):
+            self._tables.pop(t, None)
+            self.story.pop(t, None)
+        self._first = max(self._first, before)
+        # Keep the last version and change before the horizon: retained
+        # steps inherit from them.
+        for log in (*self._versions.values(), *self._changes.values()):
+            steps, items = log
+            i = bisect_right(steps, before - 1)
+            if i > 1:
+                del steps[: i - 1], items[: i - 1]
+        self._compact_registry()
 
-        for rule in self.rules:
-            if rule.is_applicable(clause, self.knowledge[t], self.story):
-                rule.perform(self.world)
-                rule.update_knowledge(self.world, self.knowledge[t], clause)
+    def _compact_registry(self) -> None:
+        # Retained facts can still be supported by clauses of forgotten
+        # steps, so keep every clause a mask uses, and the retained story.
+        indexes: dict[int, PropertyIndex] = {}
+        for _, versions in self._versions.values():
+            for props in versions:
+                for index in props.props.values():
+                    indexes[id(index)] = index
+        for _, changes in self._changes.values():
+            for index in changes:
+                if index is not None:
+                    indexes[id(index)] = index
+        facts = {id(fact): fact for index in indexes.values() for fact in index.facts}
+        registry = self.registry
+        live = 0
+        for fact in facts.values():
+            live |= fact["support"]
+        for clause in self.story.values():
+            live |= 1 << registry.index(clause)
+        if live.bit_count() == len(registry):
+            return
+        # Facts are shared between snapshots, so rewriting each one once
+        # updates every snapshot holding it.
+        remap = registry.compact(live)
+        for fact in facts.values():
+            fact["support"] = remap(fact["support"])
+        for index in indexes.values():
+            index._values = None
 
     def current(self) -> KnowledgeTable:
         return self.knowledge[self.t]
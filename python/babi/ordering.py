@@ -0,0 +1,193 @@
+"""Known ordering of objects for the Size task.
+
+Port of ``babi.Ordering`` from ``lua/babi/tasks/Size.lua``: a DAG with an
+edge ``x -> y`` for every "x is bigger than y" fact, labelled with the clause
+that stated it. The Lua version walks the graph again for every query; here
+the transitive closure is kept as integer bitsets (bit ``j`` of
+``descendants[i]`` is set when node ``i`` reaches node ``j``) and updated
+incrementally on ``add``. Shortest paths come from layers of bitsets, where
+``layer k`` holds the nodes within ``k`` edges of every node; layers are
+built on demand and kept until the graph changes.
+
+``edges`` is a read-only view, so that the closure cannot get out of sync
+with the graph; change it through ``add`` and ``remove``.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from types import MappingProxyType
+from typing import Any, Iterator, Mapping
+
+
+def _bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class Ordering:
+    def __init__(self):
+        self._edges: dict[Any, dict[Any, Any]] = {}
+        self._views: dict[Any, Mapping[Any, Any]] = {}
+        self.nodes: list[Any] = []
+        self.index: dict[Any, int] = {}
+        self.descendants: list[int] = []
+        self.ancestors: list[int] = []
+        self._children: list[list[int]] = []
+        self._layers: list[list[int]] = []
+
+    @property
+    def edges(self) -> Mapping[Any, Mapping[Any, Any]]:
+        """``edges[x][y]`` is the label of ``x -> y``."""
+
+        return MappingProxyType(self._views)
+
+    def _node(self, x: Any) -> int:
+        i = self.index.get(x)
+        if i is None:
+            i = self.index[x] = len(self.nodes)
+            self.nodes.append(x)
+            self.descendants.append(0)
+            self.ancestors.append(0)
+            self._children.append([])
+        return i
+
+    def add(self, x: Any, y: Any, obj: Any = None) -> None:
+        """Record ``x -> y``, labelled with ``obj`` (True by default)."""
+
+        label = True if obj is None else obj
+        children = self._edges.get(x)
+        if children is not None and y in children:
+            children[y] = label
+            return
+        if x == y or self.reaches(y, x):
+            raise ValueError(f"{x} -> {y} would make the ordering cyclic")
+        i, j = self._node(x), self._node(y)
+        if children is None:
+            children = self._edges[x] = {}
+            self._views[x] = MappingProxyType(children)
+        children[y] = label
+        self._children[i].append(j)
+        # Everything above x now reaches everything below y.
+        up, down = 1 << i | self.ancestors[i], 1 << j | self.descendants[j]
+        for a in _bits(up):
+            self.descendants[a] |= down
+        for b in _bits(down):
+            self.ancestors[b] |= up
+        self._layers = []
+
+    def remove(self, x: Any, y: Any) -> None:
+        """Drop ``x -> y``; the closure is rebuilt, so prefer checking before adding."""
+
+        del self._edges[x][y]
+        i, j = self.index[x], self.index[y]
+        self._children[i].remove(j)
+        n = len(self.nodes)
+        self.descendants, self.ancestors = [0] * n, [0] * n
+        for u in reversed(self._topo_indices()):
+            for v in self._children[u]:
+                self.descendants[u] |= 1 << v | self.descendants[v]
+        for u in range(n):
+            for v in _bits(self.descendants[u]):
+                self.ancestors[v] |= 1 << u
+        self._layers = []
+
+    def reaches(self, x: Any, y: Any) -> bool:
+        i, j = self.index.get(x), self.index.get(y)
+        return i is not None and j is not None and bool(self.descendants[i] >> j & 1)
+
+    def get_roots(self) -> list[Any]:
+        return [x for x in self._edges if not self.ancestors[self.index[x]]]
+
+    def _topo_indices(self) -> list[int]:
+        degree = [0] * len(self.nodes)
+        for children in self._children:
+            for v in children:
+                degree[v] += 1
+        queue = deque(u for u, d in enumerate(degree) if d == 0)
+        order = []
+        while queue:
+            u = queue.popleft()
+            order.append(u)
+            for v in self._children[u]:
+                degree[v] -= 1
+                if degree[v] == 0:
+                    queue.append(v)
+        return order
+
+    def toposort(self) -> list[Any]:
+        return [self.nodes[u] for u in self._topo_indices()]
+
+    def single_source(self, x: Any) -> tuple[dict[Any, int], dict[Any, Any]]:
+        """Hop distances from ``x`` and the previous node on a shortest path."""
+
+        dist, prev = {x: 0}, {}
+        queue = deque([x])
+        while queue:
+            u = queue.popleft()
+            for v in self._edges.get(u, ()):
+                if v not in dist:
+                    dist[v] = dist[u] + 1
+                    prev[v] = u
+                    queue.append(v)
+        return dist, prev
+
+    def _layer(self, k: int) -> list[int]:
+        """Bitsets of the nodes within ``k`` edges of every node."""
+
+        layers = self._layers
+        if not layers:
+            layers.append([1 << i for i in range(len(self.nodes))])
+        while len(layers) <= k:
+            last = layers[-1]
+            layer = []
+            for i, within in enumerate(last):
+                full = 1 << i | self.descendants[i]
+                if within != full:
+                    for j in self._children[i]:
+                        within |= last[j]
+                layer.append(within)
+            layers.append(layer)
+        return layers[k]
+
+    def _at_distance(self, i: int, k: int) -> int:
+        return self._layer(k)[i] & ~self._layer(k - 1)[i] if k > 0 else 1 << i
+
+    def _path(self, i: int, j: int, k: int) -> list[Any]:
+        # Follow any child that is still within reach of j.
+        path = []
+        for step in range(k - 1, -1, -1):
+            layer = self._layer(step)
+            u = next(v for v in self._children[i] if layer[v] >> j & 1)
+            path.append(self._edges[self.nodes[i]][self.nodes[u]])
+            i = u
+        return path
+
+    def shortest_path(self, x: Any, y: Any) -> list[Any]:
+        """Edge labels along a shortest path from ``x`` to ``y`` (empty if none)."""
+
+        if not self.reaches(x, y):
+            return []
+        i, j = self.index[x], self.index[y]
+        k = 1
+        while not self._layer(k)[i] >> j & 1:
+            k += 1
+        return self._path(i, j, k)
+
+    def has_paths_of_length(self, l: int) -> bool:
+        return l > 0 and any(self._at_distance(i, l) for i in range(len(self.nodes)))
+
+    def get_paths_of_length(self, l: int) -> dict[tuple[Any, Any], list[Any]]:
+        """Shortest paths of ``l >= 1`` edges, keyed by their ends in topological order."""
+
+        if l < 1:
+            return {}
+        order = self._topo_indices()
+        position = {u: p for p, u in enumerate(order)}
+        paths = {}
+        for i in order:
+            for j in sorted(_bits(self._at_distance(i, l)), key=position.__getitem__):
+                paths[self.nodes[i], self.nodes[j]] = self._path(i, j, l)
+        return paths
@@ -0,0 +1,134 @@
+"""Opt-in counters and timers for the generation pipeline.
+
+Instrumented code checks ``profiling.active`` and does nothing else while
+it is None, so profiling costs one attribute lookup per call when disabled::
+
+    with profiling.enabled() as profile:
+        task.generate()
+    print(profile.report())
+
+Counters and timers (in seconds) are keyed by dotted names, e.g.
+``sample_valid.calls`` or ``knowledge.rules``. With ``trace_memory`` the peak
+``tracemalloc`` size of every generated story, above what was allocated
+when it started, is recorded as well.
+"""
+
+from __future__ import annotations
+
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+
+@dataclass
+class Profile:
+    trace_memory: bool = False
+    counters: Counter = field(default_factory=Counter)
+    timers: dict[str, float] = field(default_factory=dict)
+    peaks: list[int] = field(default_factory=list)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def merge(self, other: "Profile") -> None:
+        """Add the stats of ``other``, e.g. collected in a worker process."""
+
+        self.counters.update(other.counters)
+        for name, seconds in other.timers.items():
+            self.add_time(name, seconds)
+        self.peaks.extend(other.peaks)
+
+    def as_dict(self) -> dict[str, Any]:
+        stats: dict[str, Any] = {"counters": dict(self.counters), "timers": dict(self.timers)}
+        if self.peaks:
+            stats["peak_memory"] = {"max": max(self.peaks), "mean": sum(self.peaks) / len(self.peaks)}
+        return stats
+
+    def report(self) -> str:
+        lines = [f"{name:<32} {self.counters[name]:>12}" for name in sorted(self.counters)]
+        lines += [f"{name:<32} {seconds:>12.3f}s" for name, seconds in sorted(self.timers.items())]
+        if self.peaks:
+            mean = sum(self.peaks) / len(self.peaks)
+            lines.append(f"{'story.peak_memory':<32} {max(self.peaks):>12} B max, {mean:.0f} B mean")
+        return "\n".join(lines)
+
+
+active: Profile | None = None
+_started_tracing = False
+
+
+def enable(profile: Profile | None = None) -> Profile:
+    """Start collecting into ``profile`` (a new one by default)."""
+
+    global active, _started_tracing
+    active = profile if profile is not None else Profile()
+    if active.trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+    return active
+
+
+def disable() -> Profile | None:
+    """Stop collecting and return the profile that was active."""
+
+    global active, _started_tracing
+    profile, active = active, None
+    if _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+    return profile
+
+
+@contextmanager
+def enabled(profile: Profile | None = None, trace_memory: bool = False) -> Iterator[Profile]:
+    previous = active
+    profile = enable(profile if profile is not None else Profile(trace_memory))
+    try:
+        yield profile
+    finally:
+        disable()
+        if previous is not None:
+            enable(previous)
+
+
+def collect() -> Profile:
+    """Stats gathered so far; collection continues into a fresh profile."""
+
+    profile = active if active is not None else Profile()
+    enable(Profile(profile.trace_memory))
+    return profile
+
+
+@contextmanager
+def story() -> Iterator[None]:
+    """Count and time one generated story, with its peak memory if traced."""
+
+    profile = active
+    if profile is None:
+        yield
+        return
+    profile.count("story.count")
+    if profile.trace_memory:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_time("story", time.perf_counter() - start)
+        if profile.trace_memory:
+            profile.peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
@@ -9,3 +9,4 @@ class Question:
     kind: str
     args: Any
     support: Any
+    answer: Any = None
@@ -4,6 +4,14 @@ from typing import Any
 
 
 class Rule:
+    # Names of the actions (keys of ``actions`` or class names) and the
+    # properties whose changes can make this rule applicable. ``Knowledge``
+    # only tests a rule when one of them occurs; with both None it tests the
+    # rule on every clause. Rules with ``properties`` are re-run on the facts
+    # derived by other rules until nothing changes.
+    actions: frozenset[str] | None = None
+    properties: frozenset[str] | None = None
+
     def perform(self, world: Any) -> None:
         return
 
@@ -0,0 +1,168 @@
+"""Prefetching story iterator for training loops.
+
+Usage::
+
+    with babi.stream("WhereIsActor", seed=0, workers=4) as stories:
+        for text in stories:
+            ...
+
+Stories are generated ahead of the consumer in worker processes, in chunks
+of ``chunk_size``. At most ``prefetch`` chunks are in flight or waiting to
+be read, so workers pause while the consumer is busy. Story ``i`` comes from
+``story_seed(seed, i)`` as in ``babi.generate``, so the stream yields the
+same stories in the same order for any number of workers. With a frozen
+``babi.export.Vocabulary`` the stream yields tokenized stories (lists of
+``TokenizedLine``) instead of text; ``vocab=True`` uses
+``Vocabulary.from_world`` of a new world of the task, kept as ``vocab``.
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+from collections import deque
+from multiprocessing import Pool
+from typing import Any, Iterator
+
+from .generate import _init_worker, _worker, generate_story, load_task, sample_story, story_seed, task_config
+from .task import Task
+
+
+CHUNK_SIZE = 64
+PREFETCH = 8
+
+
+def _generate_chunk(bounds: tuple[int, int]) -> list[Any]:
+    return _chunk(_worker["task"], _worker["config"], _worker["seed"], _worker["vocab"], bounds)
+
+
+def _chunk(task: Task, config: dict[str, Any], seed: int, vocab: Any, bounds: tuple[int, int]) -> list[Any]:
+    if vocab is None:
+        return [generate_story(task, config, story_seed(seed, index)) for index in range(*bounds)]
+
+    from .export import tokenize_story
+
+    stories = []
+    for index in range(*bounds):
+        story, _ = sample_story(task, config, story_seed(seed, index))
+        stories.append(tokenize_story(story, vocab))
+    return stories
+
+
+class StoryStream:
+    """Iterator over the stories ``start``, ``start + 1``, ... (up to ``stop``) of a task.
+
+    With ``workers=0`` stories are generated in the calling process when
+    they are read, leaving the state of ``random`` as it was. ``close`` (or leaving the ``with`` block) stops the
+    workers; exhausted streams close themselves.
+    """
+
+    def __init__(
+        self,
+        task: str | Task | type[Task],
+        config: dict[str, Any] | None = None,
+        seed: int = 0,
+        workers: int = 2,
+        start: int = 0,
+        stop: int | None = None,
+        chunk_size: int = CHUNK_SIZE,
+        prefetch: int = PREFETCH,
+        vocab: Any = None,
+    ):
+        self._pool = None
+        self._pending: deque[Any] = deque()
+        self._chunk: Iterator[Any] = iter(())
+        self.closed = False
+        task = load_task(task)
+        config = task_config(task, config)
+        if vocab is True:
+            from .export import Vocabulary
+
+            vocab = Vocabulary.from_world(task.new_world(dict(config)), frozen=True)
+        elif vocab is not None and not vocab.frozen:
+            # Every worker would grow its own copy and assign different ids.
+            raise ValueError("streaming tokenized stories needs a frozen vocabulary")
+        self.task, self.config, self.seed, self.vocab = task, config, seed, vocab
+        self.chunk_size = chunk_size
+        self.prefetch = max(prefetch, 1)
+        self._starts = itertools.count(start, chunk_size) if stop is None else iter(range(start, stop, chunk_size))
+        self._stop = stop
+        if workers > 0:
+            self._pool = Pool(workers, initializer=_init_worker, initargs=(task, config, seed, None, None, vocab))
+
+    def _bounds(self) -> tuple[int, int] | None:
+        start = next(self._starts, None)
+        if start is None:
+            return None
+        stop = start + self.chunk_size
+        return start, stop if self._stop is None else min(stop, self._stop)
+
+    def _fill(self) -> None:
+        while len(self._pending) < self.prefetch:
+            bounds = self._bounds()
+            if bounds is None:
+                return
+            self._pending.append(self._pool.apply_async(_generate_chunk, (bounds,)))
+
+    def _next_chunk(self) -> list[Any] | None:
+        if self._pool is None:
+            bounds = self._bounds()
+            if bounds is None:
+                return None
+            state = random.getstate()
+            try:
+                return _chunk(self.task, self.config, self.seed, self.vocab, bounds)
+            finally:
+                random.setstate(state)
+        self._fill()
+        if not self._pending:
+            return None
+        chunk = self._pending.popleft().get()
+        self._fill()
+        return chunk
+
+    def __iter__(self) -> "StoryStream":
+        return self
+
+    def __next__(self) -> Any:
+        while True:
+            story = next(self._chunk, None)
+            if story is not None:
+                return story
+            if self.closed:
+                raise StopIteration
+            try:
+                chunk = self._next_chunk()
+            except BaseException:
+                self.close()
+                raise
+            if chunk is None:
+                self.close()
+                raise StopIteration
+            self._chunk = iter(chunk)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._pending.clear()
+        self._chunk = iter(())
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self) -> "StoryStream":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        self.close()
+
+
+def stream(task: str | Task | type[Task], config: dict[str, Any] | None = None, seed: int = 0, **options: Any) -> StoryStream:
+    """Prefetching iterator over generated stories; see ``StoryStream``."""
+
+    return StoryStream(task, config, seed, **options)
@@ -1,23 +1,100 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Iterator, TextIO
 
 
-def stringify(story: list[Any], knowledge: Any, config: dict[str, Any] | None = None) -> str:
-    """Minimal Python renderer.
+def _name(value: Any) -> str:
+    return getattr(value, "name", str(value))
 
-    The Lua version ships a very extensive template engine; this Python port
-    provides a compact symbolic renderer that keeps generated data usable.
+
+def render_lines(story: list[Any], knowledge: Any, config: dict[str, Any] | None = None) -> Iterator[str]:
+    """Yield the numbered lines of a story one at a time.
+
+    Questions with an ``answer`` use the bAbI layout
+    ``idx question<TAB>answer<TAB>support line numbers``; other questions are
+    rendered symbolically with their support as a list.
     """
 
-    lines = []
+    # Supports hold clauses (resolved lazily from registry bitmasks); print
+    # them as the story line numbers they refer to. Facts that are not lines
+    # of the story, such as setup clauses, are left out, as in
+    # ``babi.export.tokenize_story``.
+    line_of = {id(item): idx for idx, item in enumerate(story, start=1)}
     for idx, item in enumerate(story, start=1):
         if hasattr(item, "truth_value") and hasattr(item, "actor") and hasattr(item, "action"):
             truth = "not " if not item.truth_value else ""
-            args = " ".join(getattr(arg, "name", str(arg)) for arg in item.args)
-            lines.append(f"{idx} {truth}{item.actor.name} {item.action} {args}".strip())
+            args = " ".join(_name(arg) for arg in item.args)
+            yield f"{idx} {truth}{item.actor.name} {item.action} {args}".strip()
         elif hasattr(item, "kind"):
             args = getattr(item, "args", None)
-            support = sorted(getattr(item, "support", []))
-            lines.append(f"{idx} ? {item.kind} {args} {support}")
-    return "\n".join(lines)
+            support = sorted(line_of[id(fact)] for fact in getattr(item, "support", None) or [] if id(fact) in line_of)
+            answer = getattr(item, "answer", None)
+            if answer is None:
+                yield f"{idx} ? {item.kind} {args} {support}"
+            else:
+                if isinstance(answer, (list, tuple, set, frozenset)):
+                    answer = ",".join(_name(a) for a in answer)
+                else:
+                    answer = _name(answer)
+                yield f"{idx} {item.kind} {args}\t{answer}\t{' '.join(map(str, support))}"
+
+
+def stringify(story: list[Any], knowledge: Any, config: dict[str, Any] | None = None) -> str:
+    """Minimal Python renderer.
+
+    The Lua version ships a very extensive template engine; this Python port
+    provides a compact symbolic renderer that keeps generated data usable.
+    """
+
+    return "\n".join(render_lines(story, knowledge, config))
+
+
+class StoryWriter:
+    """Render stories straight into a text sink through one reused buffer.
+
+    Lines are collected in a list that is written out and cleared whenever
+    it holds ``buffer_size`` characters, so memory does not grow with story
+    length or with the number of stories written.
+    """
+
+    def __init__(self, sink: TextIO, buffer_size: int = 1 << 20):
+        self.sink = sink
+        self.buffer_size = buffer_size
+        self._buffer: list[str] = []
+        self._size = 0
+
+    def write_line(self, line: str) -> None:
+        self._buffer.append(line)
+        self._buffer.append("\n")
+        self._size += len(line) + 1
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def write(self, story: list[Any], knowledge: Any, config: dict[str, Any] | None = None) -> None:
+        for line in render_lines(story, knowledge, config):
+            self.write_line(line)
+
+    def write_text(self, text: str) -> None:
+        """Write an already rendered story."""
+
+        self.write_line(text)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self.sink.write("".join(self._buffer))
+            self._buffer.clear()
+            self._size = 0
+
+    def __enter__(self) -> "StoryWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.flush()
+
+
+def write_story(story: list[Any], knowledge: Any, sink: TextIO, config: dict[str, Any] | None = None) -> None:
+    """Write one rendered story to ``sink``, one line at a time."""
+
+    for line in render_lines(story, knowledge, config):
+        sink.write(line)
+        sink.write("\n")
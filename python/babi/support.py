@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Iterable, Iterator
+
+
+def _bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class ClauseRegistry:
+    """Maps clauses and questions to small integer indices.
+
+    Each ``Knowledge`` owns one registry; supporting facts are then stored as
+    integer bitmasks over it instead of sets of ``Clause`` objects.
+    ``compact`` drops the items no mask uses any more, so that indices (and
+    with them the width of the masks) stay small in long stories.
+    """
+
+    def __init__(self) -> None:
+        self.items: list[Any] = []
+        self._index: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, i: int) -> Any:
+        return self.items[i]
+
+    def index(self, item: Any) -> int:
+        # Questions are unhashable dataclasses, so register by identity.
+        i = self._index.get(id(item))
+        if i is None:
+            i = len(self.items)
+            self.items.append(item)
+            self._index[id(item)] = i
+        return i
+
+    def find(self, item: Any) -> int | None:
+        return self._index.get(id(item))
+
+    def compact(self, live: int) -> Callable[[int], int]:
+        """Keep the items whose bits are set in ``live``, in order, and renumber them.
+
+        Returns the function that rewrites a mask over the old indices into
+        one over the new indices. The item list is replaced rather than
+        changed, so ``Support`` objects made before still resolve to their
+        own items.
+        """
+
+        kept = list(_bits(live))
+        self.items = [self.items[i] for i in kept]
+        self._index = {id(item): i for i, item in enumerate(self.items)}
+        bit = {old: 1 << new for new, old in enumerate(kept)}
+
+        def remap(mask: int) -> int:
+            new = 0
+            for i in _bits(mask):
+                new |= bit[i]
+            return new
+
+        return remap
+
+    def mask(self, support: Any) -> int:
+        if not support:
+            return 0
+        if isinstance(support, int):
+            return support
+        if isinstance(support, Support):
+            if support.registry is self and support.items is self.items:
+                return support.mask
+            support = list(support)
+        mask = 0
+        for item in support:
+            mask |= 1 << self.index(item)
+        return mask
+
+
+class Support:
+    """Immutable set of supporting facts backed by a bitmask.
+
+    Behaves like a read-only set of clauses: items are only resolved through
+    the registry when iterated. ``items`` is the registry's item list when
+    the support was made, so that the bits keep their meaning after the
+    registry is compacted.
+    """
+
+    __slots__ = ("registry", "mask", "items")
+
+    def __init__(self, registry: ClauseRegistry, mask: int = 0):
+        self.registry = registry
+        self.mask = mask
+        self.items = registry.items
+
+    def indices(self) -> list[int]:
+        return list(_bits(self.mask))
+
+    def __iter__(self) -> Iterator[Any]:
+        return (self.items[i] for i in self.indices())
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __contains__(self, item: object) -> bool:
+        if self.items is not self.registry.items:
+            return any(fact is item for fact in self)
+        i = self.registry.find(item)
+        return i is not None and bool(self.mask >> i & 1)
+
+    def __or__(self, other: Iterable[Any] | int | None) -> "Support":
+        return Support(self.registry, self.registry.mask(self) | self.registry.mask(other))
+
+    __ror__ = __or__
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Support) and other.registry is self.registry and other.items is self.items:
+            return self.mask == other.mask
+        if isinstance(other, (set, frozenset)):
+            return set(self) == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.mask)
+
+    def __repr__(self) -> str:
+        return f"Support({self.indices()})"
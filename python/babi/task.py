@@ -1,14 +1,50 @@
 from __future__ import annotations
 
+import time
 from typing import Any
 
+from . import profiling
+from .digest import story_digest
 from .knowledge import Knowledge
 from .stringify import stringify
 
 
+MAX_ATTEMPTS = 1000
+
+
 class Task:
-    def generate(self, config: dict[str, Any] | None = None) -> str:
+    def sample(self, config: dict[str, Any] | None = None):
         config = config or {}
         world = self.new_world(config)
-        story, knowledge = self.generate_story(world, Knowledge(world), [], config)
-        return stringify(story, knowledge, config)
+        knowledge = Knowledge(world, lazy=bool(config.get("lazy_knowledge", False)))
+        return self.generate_story(world, knowledge, [], config)
+
+    def generate(self, config: dict[str, Any] | None = None, seen: Any = None) -> str:
+        """Render one story.
+
+        With ``seen`` (a set of ``babi.digest.story_digest`` values, or a
+        ``BloomFilter``), stories already in it are resampled and the digest
+        of the returned story is added to it. Raises RuntimeError when no
+        unseen story turns up in ``MAX_ATTEMPTS`` samples, e.g. once every
+        story a small task can tell has been seen.
+        """
+
+        config = config or {}
+        for _ in range(MAX_ATTEMPTS):
+            story, knowledge = self.sample(config)
+            profile = profiling.active
+            if profile is None:
+                text = stringify(story, knowledge, config)
+            else:
+                start = time.perf_counter()
+                text = stringify(story, knowledge, config)
+                profile.add_time("render", time.perf_counter() - start)
+            if seen is None or not text:
+                return text
+            digest = story_digest(text)
+            if digest not in seen:
+                seen.add(digest)
+                return text
+            if profile is not None:
+                profile.count("story.duplicates")
+        raise RuntimeError(f"{type(self).__name__} produced no unseen story in {MAX_ATTEMPTS} attempts")
@@ -0,0 +1,164 @@
+"""Byte-offset index and random-access reader for generated text datasets.
+
+Usage::
+
+    python -m babi.textindex FILE [FILE ...]
+
+writes ``FILE.idx`` next to every dataset file. A story starts on each line
+beginning with ``1 ``, as in ``data-stats.sh``. The index holds, per story,
+its start byte, number of lines and number of questions (lines with a tab,
+or ``N ? ...`` lines from the symbolic Python renderer).
+"""
+
+from __future__ import annotations
+
+import argparse
+import mmap
+import os
+import random
+import struct
+from array import array
+from pathlib import Path
+from typing import Iterator
+
+
+MAGIC = b"BABIIDX1"
+HEADER = struct.Struct("<8sqqq")
+
+
+def is_question(line: bytes) -> bool:
+    if b"\t" in line:
+        return True
+    parts = line.split(None, 2)
+    return len(parts) > 1 and parts[1] == b"?"
+
+
+class StoryIndex:
+    """Start offsets (plus the end of the file), line and question counts per story."""
+
+    def __init__(self, offsets: array, lines: array, questions: array, size: int = 0, mtime_ns: int = 0):
+        self.offsets = offsets
+        self.lines = lines
+        self.questions = questions
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @classmethod
+    def build(cls, path: str | Path) -> "StoryIndex":
+        """Index ``path`` in one streaming pass."""
+
+        offsets, lines, questions = array("q"), array("i"), array("i")
+        position = 0
+        stat = os.stat(path)
+        with open(path, "rb", buffering=1 << 20) as handle:
+            for line in handle:
+                if line.startswith(b"1 "):
+                    offsets.append(position)
+                    lines.append(0)
+                    questions.append(0)
+                if lines and line.strip():
+                    lines[-1] += 1
+                    questions[-1] += is_question(line)
+                position += len(line)
+        offsets.append(position)
+        return cls(offsets, lines, questions, position, stat.st_mtime_ns)
+
+    def is_current(self, path: str | Path) -> bool:
+        stat = os.stat(path)
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def save(self, index_path: str | Path) -> None:
+        with open(index_path, "wb") as handle:
+            handle.write(HEADER.pack(MAGIC, self.size, self.mtime_ns, len(self)))
+            self.offsets.tofile(handle)
+            self.lines.tofile(handle)
+            self.questions.tofile(handle)
+
+    @classmethod
+    def load(cls, index_path: str | Path) -> "StoryIndex":
+        with open(index_path, "rb") as handle:
+            magic, size, mtime_ns, n = HEADER.unpack(handle.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{index_path} is not a story index")
+            offsets, lines, questions = array("q"), array("i"), array("i")
+            offsets.fromfile(handle, n + 1)
+            lines.fromfile(handle, n)
+            questions.fromfile(handle, n)
+        return cls(offsets, lines, questions, size, mtime_ns)
+
+
+def index_path(path: str | Path) -> Path:
+    return Path(f"{path}.idx")
+
+
+def load_index(path: str | Path, rebuild: bool = True) -> StoryIndex:
+    """The saved index of ``path``, rebuilt and saved if missing or stale."""
+
+    idx = index_path(path)
+    if idx.exists():
+        index = StoryIndex.load(idx)
+        if index.is_current(path) or not rebuild:
+            return index
+    index = StoryIndex.build(path)
+    index.save(idx)
+    return index
+
+
+class TextDataset:
+    """O(1) access to the stories of a text dataset through ``mmap``."""
+
+    def __init__(self, path: str | Path, index: StoryIndex | None = None):
+        self.path = Path(path)
+        self.index = index or load_index(path)
+        self._handle = open(path, "rb")
+        self._map = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ) if self.index.size else b""
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def raw(self, i: int) -> bytes:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("story index out of range")
+        return self._map[self.index.offsets[i] : self.index.offsets[i + 1]]
+
+    def __getitem__(self, i: int) -> str:
+        return self.raw(i).decode("utf-8").rstrip("\n")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+    def sample(self, k: int, rng: random.Random | None = None) -> list[str]:
+        """``k`` distinct stories drawn uniformly at random."""
+
+        picks = (rng or random).sample(range(len(self)), k)
+        return [self[i] for i in picks]
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._handle.close()
+
+    def __enter__(self) -> "TextDataset":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m babi.textindex", description="Index bAbI text datasets.")
+    parser.add_argument("files", nargs="+")
+    args = parser.parse_args(argv)
+    for path in args.files:
+        index = StoryIndex.build(path)
+        index.save(index_path(path))
+        print(f"{path}: {len(index)} stories, {sum(index.lines)} lines, {sum(index.questions)} questions")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,9 @@ from __future__ import annotations
 import heapq
 import random
 import shlex
+from math import inf
 from pathlib import Path
-from typing import Any
+from typing import Any, Collection
 
 
 DIRECTIONS = ["n", "s", "e", "w"]
@@ -24,13 +25,93 @@ def choice(a: list[Any] | set[Any], size: int = 1, replace: bool = False):
     return set(picks) if is_set else picks
 
 
+class GridDistances:
+    """All-pairs hop distances and next-hop table of a grid.
+
+    Built with one batched breadth-first search from every node at once
+    over a flat neighbour array. ``matrix[i - 1, j - 1]`` is the number of
+    hops between nodes ``i`` and ``j`` (-1 if unreachable) and
+    ``next_hops[i - 1, j - 1]`` the node after ``i`` on a shortest path to
+    ``j``. Requires NumPy.
+    """
+
+    def __init__(self, grid: "Grid"):
+        import numpy as np
+
+        n = grid.width * grid.height
+        degree = max((len(js) for js in grid.edges.values()), default=0)
+        # Row n is a padding row for missing neighbours.
+        neighbours = np.full((n + 1, max(degree, 1)), n, dtype=np.int64)
+        for i, js in grid.edges.items():
+            js = sorted(js)
+            neighbours[i - 1, : len(js)] = [j - 1 for j in js]
+
+        dist = np.full((n, n), -1, dtype=np.int32)
+        np.fill_diagonal(dist, 0)
+        visited = np.eye(n, dtype=bool)
+        frontier = np.zeros((n, n + 1), dtype=bool)
+        frontier[:, :n] = visited
+        level = 0
+        while True:
+            level += 1
+            reached = frontier[:, neighbours[:n]].any(axis=2) & ~visited
+            if not reached.any():
+                break
+            dist[reached] = level
+            visited |= reached
+            frontier[:, :n] = reached
+
+        next_hops = np.full((n, n), -1, dtype=np.int32)
+        for k in range(neighbours.shape[1]):
+            candidate = neighbours[:n, k]
+            valid = candidate < n
+            closer = np.zeros((n, n), dtype=bool)
+            closer[valid] = dist[candidate[valid]] == dist[valid] - 1
+            closer &= (dist > 0) & (next_hops < 0)
+            rows, cols = np.nonzero(closer)
+            next_hops[rows, cols] = candidate[rows] + 1
+
+        self.matrix = dist
+        self.next_hops = next_hops
+
+    def distance(self, i: int, j: int) -> int | None:
+        d = int(self.matrix[i - 1, j - 1])
+        return None if d < 0 else d
+
+    def next_hop(self, i: int, j: int) -> int | None:
+        hop = int(self.next_hops[i - 1, j - 1])
+        return None if hop < 0 else hop
+
+    def path(self, source: int, target: int) -> list[int] | None:
+        if self.matrix[source - 1, target - 1] < 0:
+            return None
+        path = [source]
+        while path[-1] != target:
+            path.append(int(self.next_hops[path[-1] - 1, target - 1]))
+        return path
+
+    def pairs_at_distance(self, d: int) -> list[tuple[int, int]]:
+        """Every pair of nodes ``(i, j)`` with ``i < j`` exactly ``d`` hops apart."""
+
+        import numpy as np
+
+        rows, cols = np.nonzero(np.triu(self.matrix == d, k=1))
+        return list(zip((rows + 1).tolist(), (cols + 1).tolist()))
+
+
 class Grid:
-    def __init__(self, width: int, height: int | None = None):
+    def __init__(self, width: int, height: int | None = None, all_pairs: bool = False):
         self.width = width
         self.height = height or width
+        # Answer shortest_path from the all-pairs tables (needs NumPy).
+        self.all_pairs = all_pairs
         self.nodes: dict[int, Any] = {}
         self.objects: dict[Any, int] = {}
         self.edges: dict[int, set[int]] = {i: set() for i in range(1, self.width * self.height + 1)}
+        # Bumped on every structural change; keys the path caches.
+        self.version = 0
+        self._paths: dict[tuple[Any, ...], list[int] | None] = {}
+        self._paths_version = 0
 
     def to_coordinates(self, i: int) -> tuple[int, int]:
         return ((i - 1) % self.width + 1, (i - 1) // self.width + 1)
@@ -48,6 +129,7 @@ class Grid:
         self.nodes[i] = obj or True
         if obj is not None:
             self.objects[obj] = i
+        self.version += 1
         for direction in DIRECTIONS:
             j = self.rel_node(i, direction)
             if j in self.nodes:
@@ -56,6 +138,7 @@ class Grid:
     def remove_node(self, i: int):
         obj = self.nodes.pop(i)
         self.objects.pop(obj, None)
+        self.version += 1
         edges = []
         for j in list(self.edges[i]):
             edges.append((i, j))
@@ -65,10 +148,12 @@ class Grid:
     def add_edge(self, i: int, j: int) -> None:
         self.edges[i].add(j)
         self.edges[j].add(i)
+        self.version += 1
 
     def remove_edge(self, i: int, j: int) -> None:
         self.edges[i].discard(j)
         self.edges[j].discard(i)
+        self.version += 1
 
     def manhattan(self, i: int, j: int, via: int | None = None) -> int:
         if via is not None:
@@ -77,36 +162,66 @@ class Grid:
         x2, y2 = self.to_coordinates(j)
         return abs(x1 - x2) + abs(y1 - y2)
 
+    def _cached(self, key: tuple[Any, ...], compute):
+        if self._paths_version != self.version:
+            self._paths.clear()
+            self._paths_version = self.version
+        if key not in self._paths:
+            self._paths[key] = compute()
+        return self._paths[key]
+
+    def distances(self) -> GridDistances:
+        """All-pairs distance tables, recomputed when the grid changes."""
+
+        return self._cached(("distances",), lambda: GridDistances(self))
+
+    def shortest_path(self, source: int, target: int) -> list[int] | None:
+        """Cached ``dijkstra``; the cache is dropped when the grid changes.
+
+        In ``all_pairs`` mode the path is read from the next-hop table.
+        """
+
+        if self.all_pairs:
+            return self.distances().path(source, target)
+        path = self._cached(("path", source, target), lambda: self.dijkstra(source, target))
+        return list(path) if path else None
+
     def yen(self, source: int, target: int, k: int):
-        first = self.dijkstra(source, target)
+        """The ``k`` shortest loopless paths from ``source`` to ``target``.
+
+        Spur paths are searched with the root path's nodes and the already
+        used edges masked out, so the grid itself is never modified. Spur
+        results are cached on the grid, and candidate paths already found
+        are not added twice.
+        """
+
+        paths = self._cached(("yen", source, target, k), lambda: self._yen(source, target, k))
+        return [list(path) for path in paths]
+
+    def _yen(self, source: int, target: int, k: int) -> list[list[int]]:
+        first = self.shortest_path(source, target)
         if not first:
             return []
         a = [first]
-        b = []
+        b: list[list[int]] = []
+        seen = {tuple(first)}
         for _ in range(1, k):
             for i in range(len(a[-1]) - 1):
                 spur_node = a[-1][i]
                 root_path = a[-1][: i + 1]
-                removed_edges = []
-                removed_nodes = []
-
-                for p in a:
-                    if p[: i + 1] == root_path:
-                        self.remove_edge(p[i], p[i + 1])
-                        removed_edges.append((p[i], p[i + 1]))
-
-                for node in root_path:
-                    if node != spur_node:
-                        removed_nodes.append((node, self.remove_node(node)))
-
-                spur_path = self.dijkstra(spur_node, target)
+                blocked_edges = frozenset(
+                    (min(p[i], p[i + 1]), max(p[i], p[i + 1])) for p in a if p[: i + 1] == root_path
+                )
+                blocked_nodes = frozenset(root_path[:-1])
+                spur_path = self._cached(
+                    ("spur", spur_node, target, blocked_nodes, blocked_edges),
+                    lambda: self.dijkstra(spur_node, target, blocked_nodes, blocked_edges),
+                )
                 if spur_path:
-                    b.append(root_path + spur_path[1:])
-
-                for edge in removed_edges:
-                    self.add_edge(*edge)
-                for node, (obj, _edges) in removed_nodes:
-                    self.add_node(node, obj)
+                    path = root_path + spur_path[1:]
+                    if tuple(path) not in seen:
+                        seen.add(tuple(path))
+                        b.append(path)
 
             if not b:
                 break
@@ -114,10 +229,20 @@ class Grid:
             a.append(b.pop(0))
         return a
 
-    def dijkstra(self, source: int, target: int):
-        dist = {i: float("inf") for i in range(1, self.width * self.height + 1)}
+    def dijkstra(
+        self,
+        source: int,
+        target: int,
+        blocked_nodes: Collection[int] = (),
+        blocked_edges: Collection[tuple[int, int]] = (),
+    ):
+        """Shortest path avoiding ``blocked_nodes`` and ``blocked_edges``.
+
+        Blocked edges are ``(i, j)`` pairs with ``i < j``.
+        """
+
+        dist = {source: 0}
         prev = {}
-        dist[source] = 0
         pq = [(0, source)]
 
         while pq:
@@ -127,13 +252,15 @@ class Grid:
             if u == target:
                 break
             for v in self.edges[u]:
+                if v in blocked_nodes or (blocked_edges and (min(u, v), max(u, v)) in blocked_edges):
+                    continue
                 nd = d + 1
-                if nd < dist[v]:
+                if nd < dist.get(v, inf):
                     dist[v] = nd
                     prev[v] = u
                     heapq.heappush(pq, (nd, v))
 
-        if dist[target] == float("inf"):
+        if target not in dist:
             return None
         path = [target]
         u = target
@@ -1,6 +1,11 @@
 from __future__ import annotations
 
-from typing import Any, Callable
+import hashlib
+import os
+import pickle
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Iterable, NamedTuple
 
 from .actions import actions
 from .clause import Clause
@@ -8,9 +13,52 @@ from .entity import Entity
 from .utilities import split
 
 
+def _flag(name: str) -> Callable[[Entity], bool]:
+    return lambda entity: bool(getattr(entity, name, False))
+
+
+class EntityIndex:
+    """Entities of a world that satisfy a predicate, in creation order.
+
+    The index is refreshed whenever one of ``attrs`` changes on an entity
+    (any attribute if ``attrs`` is None), and ``items`` returns the same
+    tuple until membership changes.
+    """
+
+    def __init__(self, predicate: Callable[[Entity], bool], attrs: Iterable[str] | None = None):
+        self.predicate = predicate
+        self.attrs = frozenset(attrs) if attrs is not None else None
+        self.members: dict[Entity, int] = {}
+        self._items: tuple[Entity, ...] | None = None
+
+    def refresh(self, entity: Entity, order: int) -> None:
+        if self.predicate(entity):
+            if entity not in self.members:
+                self.members[entity] = order
+                self._items = None
+        elif self.members.pop(entity, None) is not None:
+            self._items = None
+
+    def items(self) -> tuple[Entity, ...]:
+        if self._items is None:
+            self._items = tuple(sorted(self.members, key=self.members.__getitem__))
+        return self._items
+
+
 class World:
     def __init__(self, entities: dict[str, Entity] | None = None, world_actions: dict[str, Any] | None = None):
         self.entities = entities or {}
+        self._order: dict[Entity, int] = {}
+        self.indexes: dict[str, EntityIndex] = {}
+        self.register_index(
+            "actors", lambda e: getattr(e, "is_actor", False) and getattr(e, "is_god", False), ["is_actor", "is_god"]
+        )
+        self.register_index("locations", _flag("is_location"), ["is_location"])
+        self.register_index(
+            "objects", lambda e: getattr(e, "is_thing", False) and getattr(e, "is_gettable", False), ["is_thing", "is_gettable"]
+        )
+        for entity in self.entities.values():
+            self._track(entity)
         if "god" not in self.entities:
             self.create_entity("god", {"is_god": True})
         self.actions = world_actions or actions
@@ -18,15 +66,21 @@ class World:
     def god(self) -> Entity:
         return self.entities["god"]
 
-    def load(self, fname: str) -> None:
-        with open(fname, encoding="utf-8") as handle:
-            for line in handle:
-                line = line.strip()
-                if line and not line.startswith("#"):
-                    self.perform_command(f"god {line}")
+    @classmethod
+    def from_file(cls, fname: str | Path, cache_dir: str | Path | None = None) -> "World":
+        """Fresh world built from a world file through a cached template."""
+
+        return WorldTemplate.compile(fname, cache_dir).instantiate()
+
+    def load(self, fname: str | Path) -> None:
+        for command in parse_world_file(fname):
+            self.perform_parsed(["god", *command])
 
     def perform_command(self, command: str) -> None:
-        actor_id, action, *raw_args = split(command)
+        self.perform_parsed(split(command))
+
+    def perform_parsed(self, command: list[str]) -> None:
+        actor_id, action, *raw_args = command
         actor = self.entities[actor_id]
         args = [self.entities.get(arg, arg) for arg in raw_args]
         self.perform_action(action, actor, *args)
@@ -40,16 +94,182 @@ class World:
             raise ValueError("id already exists")
         entity = Entity(name or id_, properties)
         self.entities[id_] = entity
+        self._track(entity)
         return entity
 
-    def get(self, predicate: Callable[[Entity], bool]):
+    def _track(self, entity: Entity) -> None:
+        object.__setattr__(entity, "_world", self)
+        order = self._order.setdefault(entity, len(self._order))
+        for index in self.indexes.values():
+            index.refresh(entity, order)
+
+    def _entity_changed(self, entity: Entity, attr: str) -> None:
+        order = self._order.get(entity)
+        if order is None:
+            return
+        for index in self.indexes.values():
+            if index.attrs is None or attr in index.attrs:
+                index.refresh(entity, order)
+
+    def register_index(
+        self, name: str, predicate: str | Callable[[Entity], bool] | None = None, attrs: Iterable[str] | None = None
+    ) -> EntityIndex:
+        """Maintain the entities matching ``predicate`` under ``name``.
+
+        ``predicate`` may be an attribute name, e.g. ``register_index("is_animal")``,
+        in which case ``attrs`` defaults to that attribute. Otherwise list the
+        attributes the predicate reads in ``attrs``, or it is re-evaluated on
+        every attribute change.
+        """
+
+        predicate = predicate or name
+        if isinstance(predicate, str):
+            attrs = [predicate] if attrs is None else attrs
+            predicate = _flag(predicate)
+        index = EntityIndex(predicate, attrs)
+        self.indexes[name] = index
+        for entity, order in self._order.items():
+            index.refresh(entity, order)
+        return index
+
+    # These return fresh lists that callers may change; read
+    # ``indexes[name].items()`` for the shared tuple without copying.
+    def get(self, predicate: str | Callable[[Entity], bool]) -> list[Entity]:
+        if isinstance(predicate, str):
+            return list(self.indexes[predicate].items())
         return [entity for entity in self.entities.values() if predicate(entity)]
 
-    def get_actors(self):
-        return [e for e in self.entities.values() if getattr(e, "is_actor", False) and getattr(e, "is_god", False)]
+    def get_actors(self) -> list[Entity]:
+        return list(self.indexes["actors"].items())
+
+    def get_locations(self) -> list[Entity]:
+        return list(self.indexes["locations"].items())
+
+    def get_objects(self) -> list[Entity]:
+        return list(self.indexes["objects"].items())
+
+
+# Parsed files and compiled templates kept in memory, per cache.
+CACHE_SIZE = 64
+
+
+def _file_key(fname: str | Path) -> tuple[str, int, int]:
+    path = os.path.realpath(fname)
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse(key: tuple[str, int, int]) -> list[list[str]]:
+    with open(key[0], encoding="utf-8") as handle:
+        return [split(line) for line in map(str.strip, handle) if line and not line.startswith("#")]
+
+
+def parse_world_file(fname: str | Path) -> list[list[str]]:
+    """Split the commands of a world file, cached until the file changes."""
+
+    return _parse(_file_key(fname))
+
+
+def clear_caches() -> None:
+    """Forget every parsed world file and compiled template held in memory."""
+
+    _parse.cache_clear()
+    _compile.cache_clear()
+
+
+class EntityRef(NamedTuple):
+    """Reference to another entity of a template, by world id."""
+
+    id: str
+
+
+class WorldTemplate:
+    """Entity state of a loaded world that can be stamped out cheaply.
+
+    Attributes referring to other entities (``is_in``, direction links, ...)
+    are stored as ``EntityRef`` and re-linked on ``instantiate``, so every
+    clone has its own entities with the same relationships.
+    """
+
+    VERSION = 1
+
+    def __init__(self, entities: list[tuple[str, dict[str, Any]]]):
+        self.entities = entities
+
+    @classmethod
+    def from_world(cls, world: World) -> "WorldTemplate":
+        ids = {entity: id_ for id_, entity in world.entities.items()}
+
+        def ref(value: Any) -> Any:
+            if isinstance(value, Entity):
+                return EntityRef(ids[value])
+            if isinstance(value, dict):
+                return {k: ref(v) for k, v in value.items()}
+            if isinstance(value, (list, tuple)):
+                return type(value)(ref(v) for v in value)
+            return value
+
+        return cls(
+            [
+                (id_, {k: ref(v) for k, v in entity._state().items()})
+                for id_, entity in world.entities.items()
+            ]
+        )
+
+    @classmethod
+    def compile(cls, fname: str | Path, cache_dir: str | Path | None = None) -> "WorldTemplate":
+        """Template for a world file, cached in memory by path, mtime and size.
+
+        The last ``CACHE_SIZE`` templates are kept; see ``clear_caches``.
+
+        With ``cache_dir`` compiled templates are also pickled there, keyed
+        by a hash of the file contents.
+        """
+
+        return _compile(cls, _file_key(fname), None if cache_dir is None else str(cache_dir))
+
+    @classmethod
+    def _build(cls, key: tuple[str, int, int], cache_dir: str | None) -> "WorldTemplate":
+        fname = key[0]
+        template = None
+        cache_file = None
+        if cache_dir is not None:
+            digest = hashlib.sha1(Path(fname).read_bytes()).hexdigest()
+            cache_file = Path(cache_dir) / f"{digest}.v{cls.VERSION}.pickle"
+            if cache_file.exists():
+                with open(cache_file, "rb") as handle:
+                    template = pickle.load(handle)
+
+        if template is None:
+            world = World()
+            world.load(fname)
+            template = cls.from_world(world)
+            if cache_file is not None:
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp, "wb") as handle:
+                    pickle.dump(template, handle, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, cache_file)
+        return template
+
+    def instantiate(self, world_actions: dict[str, Any] | None = None) -> World:
+        entities = {id_: Entity.__new__(Entity) for id_, _ in self.entities}
+
+        def resolve(value: Any) -> Any:
+            if isinstance(value, EntityRef):
+                return entities[value.id]
+            if isinstance(value, dict):
+                return {k: resolve(v) for k, v in value.items()}
+            if isinstance(value, (list, tuple)):
+                return type(value)(resolve(v) for v in value)
+            return value
+
+        for id_, attrs in self.entities:
+            entities[id_].__setstate__({k: resolve(v) for k, v in attrs.items()})
+        return World(entities, world_actions)
 
-    def get_locations(self):
-        return [e for e in self.entities.values() if getattr(e, "is_location", False)]
 
-    def get_objects(self):
-        return [e for e in self.entities.values() if getattr(e, "is_thing", False) and getattr(e, "is_gettable", False)]
+@lru_cache(maxsize=CACHE_SIZE)
+def _compile(cls: type[WorldTemplate], key: tuple[str, int, int], cache_dir: str | None) -> WorldTemplate:
+    return cls._build(key, cache_dir)
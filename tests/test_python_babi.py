@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+import io
+import random
 from pathlib import Path
 
-from babi import Clause, Entity, Knowledge, World, actions
+import pytest
+
+from babi import Clause, Entity, Knowledge, KnowledgeTable, Question, Task, World, actions
+from babi.generate import generate_stories, write_dataset
+from babi.world import WorldTemplate
+from babi.stringify import StoryWriter, render_lines, stringify
 from babi.utilities import Grid, add_loc, split
 
 
@@ -16,6 +23,23 @@ def build_world() -> World:
     return world
 
 
+class MoveTask(Task):
+    DEFAULT_CONFIG = {"steps": 4}
+
+    def new_world(self, config):
+        return build_world()
+
+    def generate_story(self, world, knowledge, story, config):
+        actors = [world.entities["john"], world.entities["mary"]]
+        locations = [world.entities["kitchen"], world.entities["garden"]]
+        for _ in range(config["steps"]):
+            clause = Clause(world, True, world.god(), actions["set"], random.choice(actors), "is_in", random.choice(locations))
+            clause.perform()
+            knowledge.update(clause)
+            story.append(clause)
+        return story, knowledge
+
+
 def test_entity_and_clause_perform() -> None:
     world = build_world()
     john = world.entities["john"]
@@ -74,6 +98,44 @@ def test_world_load_and_command(tmp_path: Path) -> None:
     assert world.entities["john"].is_in is world.entities["kitchen"]
 
 
+def test_world_template_clones_loaded_world(tmp_path: Path) -> None:
+    script = tmp_path / "world.txt"
+    script.write_text(
+        "create kitchen\nset kitchen is_location\ncreate john\nset john is_actor\nset john is_god\n"
+        "set john is_in kitchen\n",
+        encoding="utf-8",
+    )
+    loaded = World()
+    loaded.load(str(script))
+
+    first = World.from_file(script, cache_dir=tmp_path / "cache")
+    second = WorldTemplate.compile(script).instantiate()
+    assert list((tmp_path / "cache").iterdir())
+    for world in (first, second):
+        assert sorted(world.entities) == sorted(loaded.entities)
+        assert world.entities["john"].is_in is world.entities["kitchen"]
+        assert world.get_actors() == [world.entities["john"]]
+    assert first.entities["john"] is not second.entities["john"]
+
+    first.perform_action("set", first.god(), first.entities["john"], "is_in", first.god())
+    assert second.entities["john"].is_in is second.entities["kitchen"]
+    assert second.entities["kitchen"].carry == loaded.entities["kitchen"].carry
+
+
+def test_world_file_caches_are_bounded(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    from babi import world as world_module
+
+    world_module.clear_caches()
+    for i in range(world_module.CACHE_SIZE + 5):
+        script = tmp_path / f"world{i}.txt"
+        script.write_text(f"create room{i}\nset room{i} is_location\n", encoding="utf-8")
+        World.from_file(script)
+    for cache in (world_module._parse, world_module._compile):
+        assert cache.cache_info().currsize == world_module.CACHE_SIZE
+    world_module.clear_caches()
+    assert world_module._parse.cache_info().currsize == world_module._compile.cache_info().currsize == 0
+
+
 def test_utilities_split_and_grid() -> None:
     assert split('john say "hello world"') == ["john", "say", "hello world"]
 
@@ -99,3 +161,702 @@ def test_add_loc_sets_position_and_relations() -> None:
 
     assert world.entities["a"].e is world.entities["b"]
     assert world.entities["b"].w is world.entities["a"]
+
+
+def test_knowledge_snapshots_share_untouched_entities() -> None:
+    world = build_world()
+    knowledge = Knowledge(world)
+    god = world.god()
+    john, mary = world.entities["john"], world.entities["mary"]
+    kitchen, garden = world.entities["kitchen"], world.entities["garden"]
+
+    knowledge.update(Clause(world, True, god, actions["set"], john, "is_in", kitchen))
+    knowledge.update(Clause(world, True, god, actions["set"], mary, "is_in", garden))
+    knowledge.update(Clause(world, True, god, actions["set"], john, "is_in", garden))
+
+    assert not dict.__contains__(knowledge.knowledge[2], john)
+    assert knowledge.knowledge[1][john].get_value("is_in") is kitchen
+    assert knowledge.knowledge[2][john].get_value("is_in") is kitchen
+    assert knowledge.current()[john].get_value("is_in") is garden
+    assert knowledge.current()[mary].get_value("is_in") is garden
+    assert set(knowledge.current().keys()) == {john, mary}
+    assert mary not in knowledge.knowledge[1]
+    assert knowledge.current().find("is_in", garden) == [john, mary]
+
+
+def test_support_is_bitmask_over_clause_registry() -> None:
+    world = build_world()
+    knowledge = Knowledge(world)
+    god = world.god()
+    john, milk = world.entities["john"], world.entities["milk"]
+    kitchen = world.entities["kitchen"]
+
+    first = Clause(world, True, god, actions["set"], john, "is_in", kitchen)
+    second = Clause(world, True, john, actions["get"], milk)
+    knowledge.update(first)
+    knowledge.update(second)
+
+    facts = knowledge.current()[milk].values["is_in"]
+    assert facts[0]["support"] == 1 << knowledge.registry.find(second)
+    facts.clear()
+    assert len(knowledge.current()[milk].values["is_in"]) == 1
+
+    value, support = knowledge.current()[milk].get_value("is_in", True)
+    assert value is john
+    assert list(support) == [second]
+    assert second in support and first not in support
+    assert list(support | {first}) == [first, second]
+
+    question = Question("eval", "milk", support | {first})
+    assert stringify([first, second, question], knowledge).splitlines()[-1].endswith("[1, 2]")
+
+
+def test_entity_properties_indexed_queries() -> None:
+    world = build_world()
+    knowledge = Knowledge(world)
+    knowledge.exclusive["is_in"] = True
+    kitchen, garden = world.entities["kitchen"], world.entities["garden"]
+    props = KnowledgeTable(knowledge)[world.entities["john"]]
+
+    props.add("is_in", garden, False, 0b01)
+    assert props.is_false("is_in", garden)
+    assert props.get_truth_value("is_in", kitchen) is None
+
+    props.add("is_in", kitchen, True, 0b10)
+    assert props.get_exclusive_value("is_in") is kitchen
+    assert props.get_values("is_in") == [kitchen]
+    truth, support = props.is_false("is_in", garden, True)
+    assert truth and support.mask == 0b10
+    assert props.get_non_values("is_in") == [garden]
+
+    props.values["is_in"] = [{"value": garden, "truth_value": True, "support": 0}]
+    assert props.get_value("is_in") is garden
+    assert props.is_false("is_in", kitchen)
+
+
+def test_knowledge_table_find_uses_reverse_index() -> None:
+    world = build_world()
+    knowledge = Knowledge(world)
+    god = world.god()
+    john, mary, milk = world.entities["john"], world.entities["mary"], world.entities["milk"]
+    kitchen, garden = world.entities["kitchen"], world.entities["garden"]
+
+    for clause in (
+        Clause(world, True, god, actions["set"], john, "is_in", kitchen),
+        Clause(world, True, god, actions["set"], mary, "is_in", kitchen),
+        Clause(world, True, john, actions["get"], milk),
+        Clause(world, True, god, actions["set"], john, "is_in", garden),
+        Clause(world, True, john, actions["drop"], milk),
+    ):
+        knowledge.update(clause)
+
+    assert knowledge.current().index is not None
+    assert knowledge.knowledge[3].index is None
+    assert knowledge.current().find("is_in", kitchen) == [mary]
+    assert knowledge.current().find("is_in", garden) == [john, milk]
+    assert knowledge.knowledge[3].find("is_in", kitchen) == [john, mary]
+    assert knowledge.knowledge[3].find("is_in", john) == [milk]
+
+
+def test_generate_is_reproducible_across_workers(tmp_path: Path) -> None:
+    serial, parallel = io.StringIO(), io.StringIO()
+    write_dataset(MoveTask, 10, serial, seed=3, shard_size=3)
+    write_dataset(MoveTask, 10, parallel, seed=3, workers=2, shard_size=3)
+    assert serial.getvalue() == parallel.getvalue()
+    assert serial.getvalue().count("\n1 ") == 9
+    assert serial.getvalue() == "".join(f"{text}\n" for text in generate_stories(MoveTask(), {"steps": 4}, 3, 0, 10))
+
+    paths = write_dataset(MoveTask, 10, seed=3, workers=2, shard_size=4, shard_dir=tmp_path)
+    assert [Path(p).name for p in paths] == ["MoveTask.00000.txt", "MoveTask.00001.txt", "MoveTask.00002.txt"]
+    assert "".join(Path(p).read_text(encoding="utf-8") for p in paths) == serial.getvalue()
+
+
+def test_generate_gives_up_on_tasks_without_stories(monkeypatch: pytest.MonkeyPatch) -> None:
+    from babi import generate
+
+    class EmptyTask(MoveTask):
+        def generate_story(self, world, knowledge, story, config):
+            return [], knowledge
+
+    monkeypatch.setattr(generate, "MAX_ATTEMPTS", 5)
+    for produce in (generate.generate_story, generate.sample_story):
+        with pytest.raises(RuntimeError, match="EmptyTask produced no story"):
+            produce(EmptyTask(), MoveTask.DEFAULT_CONFIG, 0)
+
+
+def test_generate_reports_tasks_it_cannot_load(capsys: pytest.CaptureFixture[str]) -> None:
+    from babi.generate import load_task, parse_args
+
+    assert isinstance(load_task("test_python_babi:MoveTask"), MoveTask)
+    for spec, message in [
+        ("1", "no module babi.tasks.WhereIsActor"),
+        ("99", "unknown task number 99"),
+        ("test_python_babi:Missing", "has no Missing"),
+    ]:
+        with pytest.raises(SystemExit):
+            parse_args([spec])
+        assert message in capsys.readouterr().err
+
+
+def test_task_generate_gives_up_once_every_story_is_seen(monkeypatch: pytest.MonkeyPatch) -> None:
+    from babi import task
+
+    class OneStoryTask(MoveTask):
+        def generate_story(self, world, knowledge, story, config):
+            return [Clause(world, True, world.god(), actions["set"], world.entities["john"], "is_actor")], knowledge
+
+    monkeypatch.setattr(task, "MAX_ATTEMPTS", 5)
+    seen: set[int] = set()
+    assert OneStoryTask().generate(seen=seen) and len(seen) == 1
+    with pytest.raises(RuntimeError, match="no unseen story"):
+        OneStoryTask().generate(seen=seen)
+
+
+def test_world_role_indexes_follow_entity_changes() -> None:
+    world = build_world()
+    john, milk = world.entities["john"], world.entities["milk"]
+
+    assert world.get_locations() == [world.entities["kitchen"], world.entities["garden"]]
+    assert world.get_objects() == [milk]
+    assert world.indexes["objects"].items() is world.indexes["objects"].items()
+    world.get_objects().append(john)
+    assert world.get_objects() == [milk]
+    assert world.get_actors() == []
+
+    world.perform_action("set", world.god(), john, "is_god")
+    assert world.get_actors() == [john]
+
+    world.register_index("is_animal")
+    assert world.get("is_animal") == []
+    cat = world.create_entity("cat", {"is_animal": True, "is_thing": True, "is_gettable": True})
+    assert world.get("is_animal") == [cat]
+    assert world.get_objects() == [milk, cat]
+
+    milk.is_gettable = False
+    assert world.get_objects() == [cat]
+
+
+def test_sample_valid_draws_from_valid_candidates() -> None:
+    world = build_world()
+    god = world.god()
+    john, mary, milk = world.entities["john"], world.entities["mary"], world.entities["milk"]
+    kitchen = world.entities["kitchen"]
+    for entity in (john, mary, milk):
+        actions["set"].perform(world, god, entity, "is_in", kitchen)
+    objects = [milk, kitchen]
+
+    assert actions["drop"].candidates(world, john, objects) == []
+    assert actions["get"].candidates(world, john, objects) == [(milk,)]
+    assert Clause.sample_valid(world, [True], [john, mary], [actions["drop"]], objects) is None
+
+    clause = Clause.sample_valid(world, [True], [john, mary], [actions["get"]], objects)
+    assert clause.is_valid() and clause.args == [milk]
+    clause.perform()
+    assert actions["give"].candidates(world, clause.actor, objects, [john, mary]) == [
+        (milk, mary if clause.actor is john else john)
+    ]
+
+
+def test_sample_valid_checks_only_drawn_clauses_of_other_actions(monkeypatch: pytest.MonkeyPatch) -> None:
+    from babi import profiling
+
+    world = build_world()
+    god = world.god()
+    for i in range(30):
+        world.create_entity(f"box{i}", {"is_thing": True})
+    boxes = [world.entities[f"box{i}"] for i in range(30)]
+    set_ = actions["set"]
+    monkeypatch.setattr(set_, "candidates", lambda *args: pytest.fail("enumerated a rejection-sampled action"))
+
+    random.seed(0)
+    with profiling.enabled() as profile:
+        picks = [Clause.sample_valid(world, [True], [god], [set_], boxes, ["is_big"]) for _ in range(200)]
+    assert all(clause.action is set_ and clause.is_valid() for clause in picks)
+    assert profile.counters["sample_valid.draws"] == 200
+    assert len({clause.args[0] for clause in picks}) > 20
+
+    # Invalid draws are redrawn, and the valid clause is found.
+    john = world.entities["john"]
+    monkeypatch.undo()
+    clause = Clause.sample_valid(world, [True], [john, god], [set_], boxes, ["is_big"])
+    assert clause.actor is god
+
+
+def test_grid_yen_does_not_mutate_grid() -> None:
+    grid = Grid(3)
+    for i in range(1, 10):
+        grid.add_node(i, f"n{i}")
+    edges = {i: set(js) for i, js in grid.edges.items()}
+    version = grid.version
+
+    paths = grid.yen(1, 9, 4)
+    assert [len(p) for p in paths] == [5, 5, 5, 5]
+    assert len({tuple(p) for p in paths}) == 4
+    assert grid.edges == edges and grid.version == version
+    assert grid.nodes[5] == "n5" and True not in grid.objects
+
+    assert grid.shortest_path(1, 9) == paths[0]
+    grid.remove_node(5)
+    assert 5 not in grid.shortest_path(1, 3) + grid.yen(1, 9, 6)[-1]
+
+
+def test_grid_all_pairs_distances() -> None:
+    pytest.importorskip("numpy")
+    grid = Grid(3, all_pairs=True)
+    for i in range(1, 10):
+        if i != 5:
+            grid.add_node(i)
+
+    distances = grid.distances()
+    assert distances.distance(1, 9) == 4
+    assert distances.distance(1, 5) is None
+    assert grid.shortest_path(2, 8) in ([2, 1, 4, 7, 8], [2, 3, 6, 9, 8])
+    assert (2, 8) in distances.pairs_at_distance(4)
+    assert all(len(grid.dijkstra(i, j)) == 3 for i, j in distances.pairs_at_distance(2))
+
+
+def test_streaming_renderer_matches_stringify() -> None:
+    world = build_world()
+    knowledge = Knowledge(world)
+    god = world.god()
+    john, kitchen = world.entities["john"], world.entities["kitchen"]
+    clause = Clause(world, True, god, actions["set"], john, "is_in", kitchen)
+    knowledge.update(clause)
+    value, support = knowledge.current()[john].get_value("is_in", True)
+    story = [clause, Question("where is", "john", support, answer=value)]
+
+    lines = list(render_lines(story, knowledge))
+    assert lines == ["1 god SetProperty john is_in kitchen", "2 where is john\tkitchen\t1"]
+    assert stringify(story, knowledge) == "\n".join(lines)
+
+    sink = io.StringIO()
+    with StoryWriter(sink, buffer_size=16) as writer:
+        writer.write(story, knowledge)
+        writer.write(story, knowledge)
+    assert sink.getvalue() == ("\n".join(lines) + "\n") * 2
+
+
+def test_support_outside_the_story_is_left_out() -> None:
+    from babi.export import Vocabulary, tokenize_story
+
+    world = build_world()
+    knowledge = Knowledge(world)
+    god = world.god()
+    john, milk, kitchen = world.entities["john"], world.entities["milk"], world.entities["kitchen"]
+    setup = Clause(world, True, god, actions["set"], john, "is_in", kitchen)
+    clause = Clause(world, True, god, actions["set"], milk, "is_in", john)
+    for item in (setup, clause):
+        knowledge.update(item)
+    # Only ``clause`` is told; the setup clause is known but not rendered.
+    story = [clause, Question("where is", "milk", {setup, clause}, answer=kitchen)]
+
+    assert list(render_lines(story, knowledge))[1] == "2 where is milk\tkitchen\t1"
+    assert list(render_lines([clause, Question("where", "milk", {setup, clause})], knowledge))[1] == "2 ? where milk [1]"
+    assert tokenize_story(story, Vocabulary.from_world(world))[1].support == [1]
+
+
+def test_binary_export_round_trip(tmp_path: Path) -> None:
+    pytest.importorskip("numpy")
+    from babi.export import BinaryDataset, BinaryShardWriter, Vocabulary
+
+    world = build_world()
+    knowledge = Knowledge(world)
+    john, kitchen = world.entities["john"], world.entities["kitchen"]
+    clause = Clause(world, True, world.god(), actions["set"], john, "is_in", kitchen)
+    knowledge.update(clause)
+    story = [clause, Question("where is", john, {clause}, answer=kitchen)]
+
+    with BinaryShardWriter(tmp_path / "shard", Vocabulary.from_world(world)) as writer:
+        writer.write(story, knowledge)
+        writer.write(story[:1], knowledge)
+
+    dataset = BinaryDataset(tmp_path / "shard")
+    assert len(dataset) == 2
+    assert dataset.decode(0) == ["1 god SetProperty john is_in kitchen", "2 where is john ?\tkitchen\t1"]
+    assert list(dataset[1].is_question) == [0]
+
+    paths = write_dataset(MoveTask, 5, seed=1, workers=2, shard_size=3, shard_dir=tmp_path / "bin", binary=True)
+    assert [len(BinaryDataset(p)) for p in paths] == [3, 2]
+    shared = Vocabulary.load(tmp_path / "bin" / "MoveTask.vocab.json")
+    assert all(BinaryDataset(p).vocab.tokens == shared.tokens for p in paths)
+    assert all(shared.ids["<unk>"] not in BinaryDataset(p).tokens for p in paths)
+    text = io.StringIO()
+    write_dataset(MoveTask, 5, text, seed=1)
+    decoded = ["\n".join(BinaryDataset(p).decode(i)) for p in paths for i in range(len(BinaryDataset(p)))]
+    assert "\n".join(decoded) + "\n" == text.getvalue()
+
+
+def test_text_index_random_access(tmp_path: Path) -> None:
+    from babi.textindex import StoryIndex, TextDataset, load_index
+
+    path = tmp_path / "data.txt"
+    path.write_text(
+        "1 john moved\n2 where is john?\tkitchen\t1\n\n1 mary moved\n2 mary left\n3 ? where mary [1]\n",
+        encoding="utf-8",
+    )
+    index = load_index(path)
+    assert list(index.lines) == [2, 3] and list(index.questions) == [1, 1]
+    assert StoryIndex.load(tmp_path / "data.txt.idx").offsets == index.offsets
+
+    with TextDataset(path) as dataset:
+        assert len(dataset) == 2
+        assert dataset[1] == "1 mary moved\n2 mary left\n3 ? where mary [1]"
+        assert dataset[0].endswith("kitchen\t1")
+        assert sorted(dataset.sample(2, random.Random(0))) == sorted(dataset)
+
+
+def test_datastats_matches_between_memory_and_disk(tmp_path: Path, monkeypatch) -> None:
+    from babi import datastats
+
+    train, test = tmp_path / "train.txt", tmp_path / "test.txt"
+    train.write_text("1 a\n2 q?\tx\t1\n1 a\n2 q?\tx\t1 \n1 b\n", encoding="utf-8")
+    test.write_text("1 b\n\n1 c\n1 c\n", encoding="utf-8")
+
+    stats = datastats.overlap_stats([str(train)], [str(test)])
+    assert stats == ((3, 2), (3, 2), 1)
+    assert stats.report().splitlines()[0] == "Overlap: 1 overlapping unique examples (50.0% of test set)"
+    assert "  Train:   3            2 (33.3% duplicates)" in stats.report()
+
+    monkeypatch.setattr(datastats, "RUN_SIZE", 1)
+    assert datastats.overlap_stats([str(train)], [str(test)], on_disk=True, tmp_dir=str(tmp_path)) == stats
+
+
+def test_generate_unique_and_disjoint_splits(tmp_path: Path) -> None:
+    from babi.datastats import BloomFilter, iter_story_digests
+
+    # Two steps over two actors and two locations allow only 16 stories.
+    config = {"steps": 2}
+    train, seen = tmp_path / "train.txt", set()
+    with open(train, "w", encoding="utf-8") as handle:
+        write_dataset(MoveTask, 12, handle, config, seed=5, shard_size=5, seen=seen)
+    digests = list(iter_story_digests(train))
+    assert len(digests) == 12 and set(digests) == seen
+
+    parallel = io.StringIO()
+    write_dataset(MoveTask, 12, parallel, config, seed=5, workers=2, shard_size=5, unique=True)
+    assert parallel.getvalue() == train.read_text(encoding="utf-8")
+
+    exclude = BloomFilter(len(seen), 1e-9)
+    exclude.update(seen)
+    paths = write_dataset(MoveTask, 4, None, config, seed=6, shard_size=3, shard_dir=tmp_path / "test", exclude=exclude)
+    test = [digest for path in paths for digest in iter_story_digests(path)]
+    assert len(set(test)) == 4 and not seen & set(test)
+
+    seen = set(digests)
+    assert MoveTask().generate(dict(config), seen) and len(seen) == 13
+
+
+def test_benchmark_report_is_json(tmp_path: Path) -> None:
+    import json
+
+    from babi import benchmark
+
+    report = benchmark.run(sizes=(2,), grid_sizes=(3,), steps=8, repeat=1, tasks=[MoveTask])
+    report = json.loads(json.dumps(report))
+    names = {result["name"] for result in report["results"]}
+    assert {"knowledge.update", "clause.sample_valid", "world.load", "grid.paths", "stringify"} <= names
+    assert {result["params"].get("task") for result in report["results"]} >= {"WalkTask", "MoveTask"}
+    assert all(value > 0 for result in report["results"] for value in result["metrics"].values())
+    assert len(benchmark.compare(report, report)) == sum(len(result["metrics"]) for result in report["results"])
+
+
+def test_profiling_collects_stats_from_workers() -> None:
+    from babi import profiling
+
+    profile = profiling.Profile(trace_memory=True)
+    write_dataset(MoveTask, 6, io.StringIO(), seed=2, workers=2, shard_size=2, profile=profile)
+    assert profiling.active is None
+    assert profile.counters["story.count"] == 6
+    assert profile.counters["knowledge.updates"] == 6 * MoveTask.DEFAULT_CONFIG["steps"]
+    assert {"knowledge.snapshot", "knowledge.update_knowledge", "knowledge.rules", "render"} <= set(profile.timers)
+    assert len(profile.peaks) == 6 and "story.peak_memory" in profile.report()
+
+    world = build_world()
+    with profiling.enabled() as profile:
+        Clause.sample_valid(world, [True], [world.god()], [actions["teleport"]], world.get_locations())
+    assert profile.counters["sample_valid.calls"] == 1
+    assert profile.counters["sample_valid.successes"] == 0
+
+
+def test_knowledge_change_log_time_queries() -> None:
+    world = build_world()
+    god = world.god()
+    john, mary, milk = world.entities["john"], world.entities["mary"], world.entities["milk"]
+    kitchen, garden = world.entities["kitchen"], world.entities["garden"]
+    knowledge = Knowledge(world)
+    story = [
+        Clause(world, True, god, actions["set"], john, "is_in", kitchen),
+        Clause(world, True, god, actions["set"], milk, "is_in", kitchen),
+        Clause(world, True, john, actions["get"], milk),
+        Clause(world, True, god, actions["set"], mary, "is_in", garden),
+        Clause(world, True, god, actions["set"], john, "is_in", garden),
+        Clause(world, True, john, actions["drop"], milk),
+    ]
+    for clause in story:
+        clause.perform()
+        knowledge.update(clause)
+
+    assert knowledge.get_changes(milk, "is_in") == [2, 3, 6]
+    assert knowledge.get_changes(john, "is_in", 2) == [5]
+    assert knowledge.get_value_at(milk, "is_in", 4) is john
+    assert knowledge.get_value_at(milk, "is_in", 1) is None
+    assert knowledge.get_value_at(john, "is_in", 5, True)[1].indices() == [4]
+
+    # While john holds the milk, its location follows john's.
+    history, supports = knowledge.get_value_history(milk, "is_in")
+    assert [place.name for place in history] == ["kitchen", "garden"]
+    assert [support.indices() for support in supports] == [[1], [2, 4]]
+    assert knowledge.get_value_history(milk, "is_in", resolve_location=False)[0] == [kitchen, john, garden]
+    assert knowledge.get_value_history(mary, "is_in")[0] == [garden]
+
+
+def test_lazy_knowledge_materializes_on_read() -> None:
+    results = []
+    for lazy in (False, True):
+        random.seed(7)
+        world = build_world()
+        knowledge = Knowledge(world, lazy=lazy)
+        story, knowledge = MoveTask().generate_story(world, knowledge, [], {"steps": 6})
+        assert len(knowledge._pending) == (6 if lazy else 0)
+        john = world.entities["john"]
+        # Reading a step only builds the steps up to it.
+        early = [
+            getattr(place, "name", None)
+            for place in (knowledge.knowledge[2][john].get_value("is_in"), knowledge.get_value_at(john, "is_in", 3))
+        ]
+        assert len(knowledge._pending) == (3 if lazy else 0) and len(knowledge.knowledge) == 6
+        history = knowledge.get_value_history(john, "is_in")[0]
+        results.append((early, [place.name for place in history], knowledge.current()[john].get_value("is_in").name))
+        assert not knowledge._pending and sorted(knowledge.knowledge) == list(range(1, 7))
+    assert results[0] == results[1]
+
+
+def test_knowledge_horizon_bounds_retained_steps() -> None:
+    from babi.knowledge import RetentionError
+
+    random.seed(3)
+    world = build_world()
+    john = world.entities["john"]
+    story, knowledge = MoveTask().generate_story(world, Knowledge(world, horizon=4), [], {"steps": 50})
+    assert 4 <= len(knowledge.knowledge) < 8 and len(knowledge.story) == len(knowledge.knowledge)
+    assert all(len(steps) <= 8 for steps, _ in knowledge._versions.values())
+    assert knowledge.current()[john].get_value("is_in") is john.is_in
+
+    first = min(knowledge.knowledge)
+    assert knowledge.get_value_history(john, "is_in", start=first)[0][-1] is john.is_in
+    with pytest.raises(RetentionError):
+        knowledge.knowledge[first - 1]
+    with pytest.raises(RetentionError):
+        knowledge.get_value_history(john, "is_in")
+
+    knowledge.forget(50)
+    assert list(knowledge.knowledge) == [50]
+    assert knowledge.get_value_at(john, "is_in", 50) is john.is_in
+
+
+def test_knowledge_horizon_compacts_the_clause_registry() -> None:
+    random.seed(3)
+    world = build_world()
+    john = world.entities["john"]
+    knowledge = Knowledge(world, horizon=4)
+    story, knowledge = MoveTask().generate_story(world, knowledge, [], {"steps": 20})
+    place, support = knowledge.get_value_at(john, "is_in", 20, True)
+    clauses = list(support)
+
+    story, knowledge = MoveTask().generate_story(world, knowledge, story, {"steps": 1000})
+    widths = [
+        fact["support"].bit_length()
+        for _, versions in knowledge._versions.values()
+        for props in versions
+        for index in props.props.values()
+        for fact in index.facts
+    ]
+    assert len(knowledge.registry) < 16 and max(widths) <= len(knowledge.registry)
+    assert knowledge.t == 1020
+    # Supports read before a compaction keep their clauses.
+    assert list(support) == clauses and all(clause in support for clause in clauses)
+    assert set(support | knowledge.support()) == set(clauses)
+
+
+def test_rules_dispatch_on_triggers_and_chain_to_a_fixed_point() -> None:
+    from babi import Rule
+
+    class Inherit(Rule):
+        """Whatever a kind is afraid of, its members are afraid of."""
+
+        properties = frozenset({"is_a"})
+
+        def update_knowledge(self, world, knowledge, clause):
+            for entity, prop in knowledge.delta:
+                if prop != "is_a":
+                    continue
+                fear = knowledge[knowledge[entity].get_value("is_a")].get_value("afraid_of")
+                if fear is not None:
+                    knowledge[entity].set("afraid_of", fear, True, {clause})
+
+    class Avoid(Rule):
+        properties = frozenset({"afraid_of"})
+
+        def update_knowledge(self, world, knowledge, clause):
+            for entity, prop in knowledge.delta:
+                if prop == "afraid_of":
+                    knowledge[entity].set("avoids", knowledge[entity].get_value("afraid_of"), True, {clause})
+
+    class OnTeleport(Rule):
+        actions = frozenset({"teleport"})
+        checked = 0
+
+        def is_applicable(self, clause, knowledge, story):
+            OnTeleport.checked += 1
+            return False
+
+    world = build_world()
+    god = world.god()
+    for name in ("mouse", "cat", "jerry"):
+        world.create_entity(name)
+    mouse, cat, jerry = (world.entities[name] for name in ("mouse", "cat", "jerry"))
+    knowledge = Knowledge(world, [Inherit(), Avoid(), OnTeleport()])
+    for clause in (
+        Clause(world, True, god, actions["set"], mouse, "afraid_of", cat),
+        Clause(world, True, god, actions["set"], jerry, "is_a", mouse),
+    ):
+        knowledge.update(clause)
+
+    facts = knowledge.current()[jerry]
+    assert facts.get_value("afraid_of") is cat and facts.get_value("avoids") is cat
+    assert knowledge.current()[mouse].get_value("avoids") is cat
+    assert OnTeleport.checked == 0
+    assert knowledge.delta
+
+    # Rules added by clauses extend the index instead of rebuilding it.
+    index = knowledge._rules()
+    knowledge.update(Avoid())
+    assert knowledge._rules() is index and index.size == 4
+    knowledge.update(Clause(world, True, god, actions["set"], cat, "color", "grey"))
+    assert knowledge.delta == frozenset()
+
+
+def test_entity_core_state_lives_in_slots() -> None:
+    import copy
+    import pickle
+
+    world = build_world()
+    world.create_entity("box")
+    box = world.entities["box"]
+    assert not box.is_actor and not hasattr(box, "is_in") and not hasattr(box, "x")
+    assert not hasattr(box, "__dict__") or not vars(box)
+
+    box.is_gettable = True
+    box.is_in = world.entities["kitchen"]
+    box.color = "red"
+    assert vars(box) == {"color": "red"}
+    assert box in world.get_objects()
+
+    for clone in (copy.deepcopy(box), pickle.loads(pickle.dumps(Entity("cup", {"size": 2, "color": "blue"})))):
+        assert clone.is_gettable == clone.name.startswith("box")
+        assert clone.color in ("red", "blue")
+        # Copies leave the world behind.
+        assert clone._world is None
+    template = WorldTemplate.from_world(world).instantiate()
+    assert template.entities["box"].color == "red" and template.entities["box"].is_in.name == "kitchen"
+
+
+def test_batch_world_matches_clause_replay() -> None:
+    from babi.batch import BatchWorld
+
+    world = build_world()
+    world.entities["john"].is_god = world.entities["mary"].is_god = True
+    milk = world.entities["milk"]
+    for name in ("john", "mary", "milk"):
+        actions["set"].perform(world, world.god(), world.entities[name], "is_in", world.entities["kitchen"])
+    batch = BatchWorld(world, 32, seed=3)
+    moves = [actions["teleport"], actions["get"], actions["drop"]]
+    pool = (*world.get_locations(), milk)
+    for step in range(12):
+        if step % 4 == 3:
+            batch.step(world.get_actors(), [actions["give"]], [milk], world.get_actors())
+        else:
+            assert batch.step(world.get_actors(), moves, pool).all()
+
+    for i, (story, knowledge) in enumerate(batch.stories()):
+        assert len(story) >= 9 and stringify(story, knowledge)
+        final = story[0].world.entities
+        for j, id_ in enumerate(batch.ids):
+            assert batch.carry[i, j] == final[id_].carry
+            place = getattr(final[id_], "is_in", None)
+            assert batch.location[i, j] == (-1 if place is None else batch.ids.index(place.name))
+
+    replay = WorldTemplate.from_world(world).instantiate()
+    for clause in batch.clauses(0, replay):
+        assert clause.is_valid()
+        clause.perform()
+    with pytest.raises(ValueError):
+        batch.step(world.get_actors(), [actions["give"]], pool)
+
+
+def test_stream_prefetches_stories_in_seed_order() -> None:
+    import babi
+    from babi.export import Vocabulary
+
+    expected = list(generate_stories(MoveTask(), MoveTask.DEFAULT_CONFIG, 5, 0, 10))
+    with babi.stream(MoveTask, seed=5, workers=2, stop=10, chunk_size=3, prefetch=2) as stories:
+        assert list(stories) == expected
+    assert stories.closed
+
+    endless = babi.stream(MoveTask, seed=5, workers=0, chunk_size=4)
+    other = babi.stream(MoveTask, {"steps": 1}, seed=6, workers=0)
+    # In-process streams keep their own settings and leave ``random`` alone.
+    state = random.getstate()
+    assert [next(endless) for _ in range(10)] == expected
+    assert random.getstate() == state and len(next(other).split("\n")) == 1
+    other.close()
+    endless.close()
+    with pytest.raises(StopIteration):
+        next(endless)
+
+    tokenized = babi.stream(MoveTask, seed=5, workers=1, stop=4, vocab=True)
+    vocab = tokenized.vocab
+    stories = list(tokenized)
+    assert len(stories) == 4 and all(line.tokens for story in stories for line in story)
+    assert all(vocab.ids["<unk>"] not in line.tokens for story in stories for line in story)
+    decoded = [f"{i} " + " ".join(vocab.decode(line.tokens)) for i, line in enumerate(stories[0], start=1)]
+    assert decoded == expected[0].split("\n")
+    with pytest.raises(ValueError):
+        babi.stream(MoveTask, vocab=Vocabulary())
+
+
+def test_ordering_keeps_closure_and_paths_by_length() -> None:
+    from babi import Ordering
+
+    ordering = Ordering()
+    for x, y in [("ocean", "house"), ("house", "box"), ("box", "ball"), ("ocean", "box")]:
+        ordering.add(x, y, f"{x}>{y}")
+
+    assert ordering.reaches("ocean", "ball") and not ordering.reaches("ball", "ocean")
+    assert ordering.get_roots() == ["ocean"]
+    assert ordering.toposort() == ["ocean", "house", "box", "ball"]
+    assert ordering.shortest_path("ocean", "ball") == ["ocean>box", "box>ball"]
+    assert ordering.get_paths_of_length(2) == {
+        ("ocean", "ball"): ["ocean>box", "box>ball"],
+        ("house", "ball"): ["house>box", "box>ball"],
+    }
+    assert not ordering.has_paths_of_length(3)
+
+    ordering.remove("ocean", "box")
+    assert ordering.get_paths_of_length(3) == {("ocean", "ball"): ["ocean>house", "house>box", "box>ball"]}
+    with pytest.raises(ValueError):
+        ordering.add("ball", "ocean")
+
+
+def test_ordering_rejected_edges_leave_it_unchanged() -> None:
+    from babi import Ordering
+
+    ordering = Ordering()
+    ordering.add("ocean", "house")
+    for x, y in [("a", "a"), ("house", "ocean")]:
+        with pytest.raises(ValueError):
+            ordering.add(x, y)
+    assert dict(ordering.edges) == {"ocean": {"house": True}} and ordering.get_roots() == ["ocean"]
+    assert ordering.nodes == ["ocean", "house"]
+    with pytest.raises(TypeError):
+        ordering.edges["ocean"]["house"] = None